@@ -0,0 +1,356 @@
+import asyncio
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from foodgram.routers import read_from_primary
+from recipes.cache import ingredients_cache, recipes_cache, tags_cache
+from recipes.models import Ingredient, Recipe, Tag
+
+from . import views
+from .authentication import CachedTokenAuthentication
+from .filters import CustomIngredientFilter, CustomRecipeFilter
+from .metrics import serialization_timer, serialized
+from .pagination import CustomUserPagination, RecipePagination
+from .rendering import recipe_renderer
+from .serializers import IngredientSerializer, RecipeSerializer, TagSerializer
+
+JSON_MEDIA_TYPES = ('application/json', 'application/*', '*/*')
+
+renderer = JSONRenderer()
+
+
+class FallbackError(Exception):
+    """Запрос должна обработать синхронная вьюха."""
+
+
+def call_in_thread(func, *args, **kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run(func, *args, **kwargs):
+    """Выполняет синхронный код (ORM, кэш) в пуле потоков.
+
+    В Django 3.2 нет асинхронного ORM, поэтому запросы идут в потоках
+    пула (у каждого своё соединение с БД); независимые вызовы можно
+    ждать одновременно через asyncio.gather.
+    """
+
+    return await sync_to_async(
+        partial(call_in_thread, func), thread_sensitive=False
+    )(*args, **kwargs)
+
+
+def json_response(content):
+    return HttpResponse(content, content_type='application/json')
+
+
+def render_json(data):
+    with serialization_timer():
+        return renderer.render(data)
+
+
+def accepts_json(request):
+    if 'format' in request.GET:
+        return False
+
+    accept = request.headers.get('Accept', '*/*')
+
+    return any(media_type in accept for media_type in JSON_MEDIA_TYPES)
+
+
+def authenticate(request):
+    """DRF-запрос с юзером из токена; FallbackError, если токен неверный."""
+
+    try:
+        credentials = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        raise FallbackError
+
+    request = Request(request)
+    if credentials is not None:
+        request.user, request.auth = credentials
+
+    return request
+
+
+def async_read(fallback):
+    """Асинхронная обработка GET-запросов с JSON-ответом.
+
+    Остальные запросы, а также GET, от которых handler отказался
+    через FallbackError, передаются синхронной вьюхе fallback.
+    """
+
+    fallback = sync_to_async(fallback)
+
+    def decorator(handler):
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method in ('GET', 'HEAD') and accepts_json(request):
+                try:
+                    if 'HTTP_AUTHORIZATION' in request.META:
+                        drf_request = await run(authenticate, request)
+                    else:
+                        drf_request = Request(request)
+                    response = await handler(drf_request, *args, **kwargs)
+                except FallbackError:
+                    pass
+                else:
+                    patch_vary_headers(response, ('Accept',))
+
+                    return response
+
+            return await fallback(request, *args, **kwargs)
+
+        view.csrf_exempt = True
+
+        return view
+
+    return decorator
+
+
+def primary_reads(handler):
+    """Асинхронная вьюха, читающая из default (см. read_from_primary)."""
+
+    @wraps(handler)
+    async def view(*args, **kwargs):
+        with read_from_primary():
+            return await handler(*args, **kwargs)
+
+    return view
+
+
+async def conditional_response(request, etag, last_modified, cache_control,
+                               build):
+    """Асинхронный вариант views.conditional_response: build — корутина."""
+
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified),
+    )
+    if response is None:
+        response = await build()
+
+    return views.set_validators(response, etag, last_modified, cache_control)
+
+
+async def paginate(request, paginator, queryset):
+    """Страница постраничной пагинации и её JSON-обёртка.
+
+    Подсчёт и строки страницы запрашиваются параллельно; страницу вне
+    диапазона (ответ 404) отдаёт синхронная вьюха.
+    """
+
+    page_size = paginator.get_page_size(request)
+    try:
+        number = int(request.query_params.get(paginator.page_query_param, 1))
+    except ValueError:
+        raise FallbackError
+
+    if number < 1:
+        raise FallbackError
+
+    offset = (number - 1) * page_size
+    count, page = await asyncio.gather(
+        run(queryset.count),
+        run(list, queryset[offset:offset + page_size]),
+    )
+    if not page and number > 1:
+        raise FallbackError
+
+    url = request.build_absolute_uri()
+    next_link = previous_link = None
+    if offset + page_size < count:
+        next_link = replace_query_param(
+            url, paginator.page_query_param, number + 1
+        )
+    if number == 2:
+        previous_link = remove_query_param(url, paginator.page_query_param)
+    elif number > 2:
+        previous_link = replace_query_param(
+            url, paginator.page_query_param, number - 1
+        )
+
+    return page, {
+        'count': count,
+        'next': next_link,
+        'previous': previous_link,
+        'results': [],
+    }
+
+
+def render_page(envelope, results):
+    """JSON страницы с уже отрендеренным массивом results."""
+
+    head, tail = render_json(envelope).rsplit(b'[]', 1)
+
+    return head + results + tail
+
+
+async def reference_response(request, cache, build):
+    with read_from_primary():
+        data, version = await run(cache.get_or_build, build)
+
+    async def build_response():
+        return json_response(render_json(data))
+
+    return await conditional_response(
+        request, f'"{cache.name}-{version}"', version, 'no-cache',
+        build_response
+    )
+
+
+def recipe_validators(request, name, versions):
+    return views.recipe_validators(
+        request.user, name, versions, 'application/json'
+    )
+
+
+async def recipe_response(request, validators, build):
+    response = await conditional_response(request, *validators, build)
+    patch_vary_headers(response, ('Authorization',))
+
+    return response
+
+
+@async_read(views.TagViewSet.as_view({'get': 'list'}))
+async def tags(request):
+    return await reference_response(
+        request,
+        tags_cache,
+        lambda: serialized(TagSerializer(Tag.objects.all(), many=True))
+    )
+
+
+@async_read(views.IngredientViewSet.as_view({'get': 'list'}))
+async def ingredients(request):
+    if request.query_params.get(CustomIngredientFilter.search_param):
+        raise FallbackError
+
+    return await reference_response(
+        request,
+        ingredients_cache,
+        lambda: serialized(
+            IngredientSerializer(Ingredient.objects.all(), many=True)
+        )
+    )
+
+
+def list_validators(request):
+    shared_versions = views.RecipeViewSet.shared_versions()
+
+    return shared_versions, recipe_validators(
+        request, 'recipes', [recipes_cache.version(), *shared_versions]
+    )
+
+
+def filter_recipes(request):
+    filterset = CustomRecipeFilter(
+        request.query_params,
+        queryset=Recipe.objects.with_user_flags(request.user),
+        request=request,
+    )
+    if not filterset.is_valid():
+        raise FallbackError
+
+    return filterset.qs.only('id', 'pub_date', 'updated_at')
+
+
+@async_read(views.RecipeViewSet.as_view({'get': 'list', 'post': 'create'}))
+@primary_reads
+async def recipes(request):
+    """Список рецептов; курсорную пагинацию и ошибки фильтров
+    обрабатывает синхронная вьюха.
+    """
+
+    if RecipePagination.cursor_query_param in request.query_params:
+        raise FallbackError
+
+    shared_versions, validators = await run(list_validators, request)
+
+    async def build():
+        page, envelope = await paginate(
+            request, RecipePagination(), await run(filter_recipes, request)
+        )
+        results = await run(
+            recipe_renderer.render,
+            request,
+            page,
+            ':'.join(map(str, shared_versions)),
+        )
+
+        return json_response(render_page(envelope, results))
+
+    return await recipe_response(request, validators, build)
+
+
+def serialize_recipe(request, pk):
+    try:
+        recipe = Recipe.objects.with_related().with_user_flags(
+            request.user
+        ).get(pk=pk)
+    except Recipe.DoesNotExist:
+        raise FallbackError
+
+    return serialized(RecipeSerializer(recipe, context={'request': request}))
+
+
+@async_read(views.RecipeViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}))
+@primary_reads
+async def recipe(request, pk):
+    updated_at, shared_versions = await asyncio.gather(
+        run(
+            Recipe.objects.filter(pk=pk).values_list(
+                'updated_at', flat=True
+            ).first
+        ),
+        run(views.RecipeViewSet.shared_versions),
+    )
+    if updated_at is None:
+        raise FallbackError
+
+    async def build():
+        return json_response(
+            render_json(await run(serialize_recipe, request, pk))
+        )
+
+    validators = await run(
+        recipe_validators,
+        request,
+        f'recipe-{pk}',
+        [updated_at.timestamp(), *shared_versions],
+    )
+
+    return await recipe_response(request, validators, build)
+
+
+@async_read(views.subscriptions)
+async def subscriptions(request):
+    if request.user.is_anonymous:
+        raise FallbackError
+
+    page, envelope = await paginate(
+        request, CustomUserPagination(), views.followed_authors(request.user)
+    )
+    envelope['results'] = await run(
+        views.serialize_subscriptions, request, page
+    )
+
+    return json_response(render_json(envelope))
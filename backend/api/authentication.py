@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+def token_cache_key(key):
+    return f'auth_token:{key}'
+
+
+def token_cache():
+    """Кэш аутентификации или None, если он локален для процесса.
+
+    Удаление токена из LocMemCache видно только обработавшему запрос
+    воркеру, остальные принимали бы отозванный токен до истечения
+    записи, поэтому кэшировать токены можно только в общем кэше.
+    """
+
+    cache = caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+    if isinstance(cache, LocMemCache):
+        return None
+
+    return cache
+
+
+def invalidate_tokens(*keys):
+    """Удаляет токены из кэша аутентификации."""
+
+    cache = token_cache()
+    if cache is not None:
+        cache.delete_many([token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием токена вместе с юзером.
+
+    Запись удаляется из кэша при удалении токена и сохранении юзера
+    (смена пароля, деактивация), см. api.signals. Без общего кэша
+    работает как TokenAuthentication.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = token_cache()
+        if cache is None:
+            return super().authenticate_credentials(key)
+
+        token = cache.get(token_cache_key(key))
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(
+                token_cache_key(key),
+                token,
+                timeout=settings.AUTH_TOKEN_CACHE_TIMEOUT,
+            )
+
+            return user, token
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+
+        return token.user, token
@@ -0,0 +1,128 @@
+import csv
+import json
+
+from django.utils.html import escape
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListExporter:
+    """Базовый экспортер списка покупок.
+
+    Отдаёт список построчно, чтобы ответ можно было стримить.
+    """
+
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def header(self):
+        return ''
+
+    def row(self, ingredient):
+        raise NotImplementedError
+
+    def footer(self):
+        return ''
+
+    def stream(self, ingredients):
+        yield self.header()
+        for ingredient in ingredients:
+            yield self.row(ingredient)
+        yield self.footer()
+
+
+class TextExporter(ShoppingListExporter):
+    """Список покупок обычным текстом."""
+
+    def header(self):
+        return 'Ваши ингредиенты: '
+
+    def row(self, ingredient):
+        return (
+            f'\n{ingredient["ingredient__name"]}'
+            f' {ingredient["amount"]}'
+            f' {ingredient["ingredient__measurement_unit"]}'
+        )
+
+
+class CsvExporter(ShoppingListExporter):
+    """Список покупок в формате csv."""
+
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def __init__(self):
+        self.writer = csv.writer(Echo())
+
+    def header(self):
+        return self.writer.writerow(('name', 'amount', 'measurement_unit'))
+
+    def row(self, ingredient):
+        return self.writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['amount'],
+            ingredient['ingredient__measurement_unit'],
+        ))
+
+
+class JsonExporter(ShoppingListExporter):
+    """Список покупок в формате json."""
+
+    content_type = 'application/json'
+    extension = 'json'
+
+    def __init__(self):
+        self.separator = ''
+
+    def header(self):
+        return '['
+
+    def row(self, ingredient):
+        separator, self.separator = self.separator, ','
+
+        return separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'amount': ingredient['amount'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+
+    def footer(self):
+        return ']'
+
+
+class HtmlExporter(ShoppingListExporter):
+    """Список покупок страницей для печати."""
+
+    content_type = 'text/html; charset=utf-8'
+    extension = 'html'
+
+    def header(self):
+        return (
+            '<!DOCTYPE html><html><head><meta charset="utf-8">'
+            '<title>Список покупок</title>'
+            '<style>body{font-family:sans-serif}'
+            'td{padding:4px 12px;border-bottom:1px solid #ccc}</style>'
+            '</head><body><h1>Ваши ингредиенты</h1><table>'
+        )
+
+    def row(self, ingredient):
+        return (
+            f'<tr><td>{escape(ingredient["ingredient__name"])}</td>'
+            f'<td>{ingredient["amount"]}</td>'
+            f'<td>{escape(ingredient["ingredient__measurement_unit"])}</td>'
+            '</tr>'
+        )
+
+    def footer(self):
+        return '</table></body></html>'
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (TextExporter, CsvExporter, JsonExporter, HtmlExporter)
+}
@@ -1,11 +1,37 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 from rest_framework import filters
 
 from recipes.models import Recipe, Tag
+from recipes.search import search_ingredients, search_recipes
 
 
-class CustomIngredientFilter(filters.SearchFilter):
-    search_param = "name"
+class CustomIngredientFilter(filters.BaseFilterBackend):
+    """Автодополнение ингредиентов по параметру name.
+
+    Совпадения по началу названия выдаются раньше совпадений по подстроке.
+    """
+
+    search_param = 'name'
+    limit_param = 'limit'
+    default_limit = 20
+    max_limit = 100
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+
+        return min(max(limit, 1), self.max_limit)
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query or view.action != 'list':
+
+            return queryset
+
+        return search_ingredients(queryset, query, self.get_limit(request))
 
 
 class CustomRecipeFilter(django_filters.FilterSet):
@@ -13,6 +39,7 @@ class CustomRecipeFilter(django_filters.FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='tags_func',
     )
     is_favorited = django_filters.rest_framework.BooleanFilter(
         method='is_favorited_func',
@@ -20,21 +47,44 @@ class CustomRecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.rest_framework.BooleanFilter(
         method='is_in_shopping_cart_func'
     )
+    search = django_filters.rest_framework.CharFilter(
+        method='search_func',
+    )
 
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart', 'search'
+        ]
+
+    def tags_func(self, queryset, name, value):
+        if value:
+
+            return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'),
+                tag__in=value,
+            )))
+
+        return queryset
 
     def is_favorited_func(self, queryset, name, value):
         if value:
 
-            return queryset.filter(selected__user=self.request.user)
+            return queryset.filter(is_favorited=True)
 
         return queryset
 
     def is_in_shopping_cart_func(self, queryset, name, value):
         if value:
 
-            return queryset.filter(shopping_recipes__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
+
+        return queryset
+
+    def search_func(self, queryset, name, value):
+        value = value.strip()
+        if value:
+
+            return search_recipes(queryset, value)
 
         return queryset
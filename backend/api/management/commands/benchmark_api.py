@@ -0,0 +1,225 @@
+import json
+import statistics
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from api.metrics import QueryRecorder
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Кастомная команда замера задержки, числа SQL-запросов и пропускной
+    способности эндпоинтов API.
+    """
+
+    help = 'Бенчмарк эндпоинтов API с сохранением результатов в json.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--output', help='Файл для сохранения json.')
+        parser.add_argument(
+            '--compare',
+            help='json предыдущего прогона для сравнения.',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=20.0,
+            help='Допустимый рост p95 в процентах при сравнении.',
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            help='Замерить только эндпоинты с указанными префиксами имён.',
+        )
+
+    def get_user(self):
+        user = User.objects.annotate(
+            follows=Count('follower')
+        ).order_by('-follows').first()
+        if user is None:
+            raise CommandError(
+                'Нет данных: сначала выполните generate_data.'
+            )
+
+        return user
+
+    def get_endpoints(self, user):
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        favorite_recipe = Recipe.objects.exclude(selected__user=user).first()
+        cart_recipe = Recipe.objects.exclude(
+            shopping_recipes__user=user
+        ).first()
+        author = User.objects.exclude(
+            author__user=user
+        ).exclude(pk=user.pk).first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.filter(
+            recipes_for_ingredients__isnull=False
+        ).first()
+
+        endpoints = [
+            ('recipes_list', 'get', '/api/recipes/'),
+            ('recipes_list_cursor', 'get', '/api/recipes/?cursor='),
+            ('recipes_list_favorited', 'get', '/api/recipes/?is_favorited=1'),
+            ('recipes_list_in_cart', 'get',
+             '/api/recipes/?is_in_shopping_cart=1'),
+            ('recipes_search', 'get', '/api/recipes/?search=рецепт'),
+            ('recipes_search_cursor', 'get',
+             '/api/recipes/?search=рецепт&cursor='),
+            ('recipes_download_cart', 'get',
+             '/api/recipes/download_shopping_cart/'),
+            ('tags_list', 'get', '/api/tags/'),
+            ('ingredients_list', 'get', '/api/ingredients/'),
+            ('ingredients_search', 'get', '/api/ingredients/?name=са'),
+            ('subscriptions', 'get', '/api/users/subscriptions/'),
+            ('users_list', 'get', '/api/users/'),
+            ('users_me', 'get', '/api/users/me/'),
+        ]
+        if tag is not None:
+            endpoints.append((
+                'recipes_list_tag', 'get', f'/api/recipes/?tags={tag.slug}'
+            ))
+        if ingredient is not None:
+            endpoints.append((
+                'recipes_search_ingredient', 'get',
+                f'/api/recipes/?{urlencode({"search": ingredient.name})}',
+            ))
+        if recipe is not None:
+            endpoints.append((
+                'recipes_detail', 'get', f'/api/recipes/{recipe.id}/'
+            ))
+        if favorite_recipe is not None:
+            endpoints.append((
+                'favorite_toggle', 'toggle',
+                f'/api/recipes/{favorite_recipe.id}/favorite/',
+            ))
+        if cart_recipe is not None:
+            endpoints.append((
+                'shopping_cart_toggle', 'toggle',
+                f'/api/recipes/{cart_recipe.id}/shopping_cart/',
+            ))
+        if author is not None:
+            endpoints.append((
+                'subscribe_toggle', 'toggle',
+                f'/api/users/{author.id}/subscribe/',
+            ))
+
+        return endpoints
+
+    def call(self, client, method, url):
+        if method == 'toggle':
+            return [client.post(url), client.delete(url)]
+
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+        return [response]
+
+    def measure(self, client, method, url, count, warmup):
+        for _ in range(warmup):
+            self.call(client, method, url)
+
+        latencies = []
+        queries = []
+        statuses = set()
+        started = time.perf_counter()
+        for _ in range(count):
+            recorder = QueryRecorder()
+            request_started = time.perf_counter()
+            with connection.execute_wrapper(recorder):
+                responses = self.call(client, method, url)
+            latencies.append((time.perf_counter() - request_started) * 1000)
+            queries.append(recorder.count)
+            statuses.update(response.status_code for response in responses)
+        duration = time.perf_counter() - started
+
+        latencies.sort()
+
+        return {
+            'url': url,
+            'requests': count,
+            'statuses': sorted(statuses),
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(
+                latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                3
+            ),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'queries': round(statistics.mean(queries), 2),
+            'rps': round(count / duration, 2),
+        }
+
+    def compare(self, results, path, threshold):
+        with open(path, encoding='utf-8') as file:
+            previous = json.load(file)['endpoints']
+
+        regressions = []
+        for name, current in results.items():
+            if name not in previous:
+                continue
+
+            before = previous[name]
+            change = (
+                (current['p95_ms'] - before['p95_ms'])
+                / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+            )
+            print(
+                f'{name:28} p95 {before["p95_ms"]:>9.2f} -> '
+                f'{current["p95_ms"]:>9.2f} мс ({change:+.1f}%), '
+                f'запросов {before["queries"]} -> {current["queries"]}'
+            )
+            if change > threshold or current['queries'] > before['queries']:
+                regressions.append(name)
+
+        return regressions
+
+    def handle(self, *args, **options):
+        user = self.get_user()
+        token, _ = Token.objects.get_or_create(user=user)
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        results = {}
+        for name, method, url in self.get_endpoints(user):
+            if options['only'] and not name.startswith(tuple(options['only'])):
+                continue
+
+            results[name] = self.measure(
+                client, method, url, options['requests'], options['warmup']
+            )
+            stats = results[name]
+            print(
+                f'{name:28} p50 {stats["p50_ms"]:>9.2f} мс  '
+                f'p95 {stats["p95_ms"]:>9.2f} мс  '
+                f'{stats["queries"]:>6} запросов  {stats["rps"]:>8} rps'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'created': datetime.now(timezone.utc).isoformat(),
+                    'database': connection.vendor,
+                    'recipes': Recipe.objects.count(),
+                    'users': User.objects.count(),
+                    'endpoints': results,
+                }, file, ensure_ascii=False, indent=2)
+            print(f'Результаты сохранены в {options["output"]}.')
+
+        if options['compare']:
+            regressions = self.compare(
+                results, options['compare'], options['threshold']
+            )
+            if regressions:
+                raise CommandError(
+                    f'Регрессии производительности: {", ".join(regressions)}.'
+                )
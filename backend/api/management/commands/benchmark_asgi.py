@@ -0,0 +1,144 @@
+import json
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Кастомная команда сравнения пропускной способности WSGI и ASGI
+    на читающих эндпоинтах при большом числе одновременных запросов.
+
+    Серверы запускаются отдельно на одних данных, например:
+    gunicorn foodgram.wsgi:application -w 4 -b 127.0.0.1:8000
+    gunicorn foodgram.asgi:application -w 4 -b 127.0.0.1:8001 \\
+        -k uvicorn.workers.UvicornWorker
+    """
+
+    help = 'Нагрузочное сравнение WSGI и ASGI серверов по HTTP.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi', default='http://127.0.0.1:8000')
+        parser.add_argument('--asgi', default='http://127.0.0.1:8001')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument(
+            '--anonymous',
+            action='store_true',
+            help='Запросы без токена.',
+        )
+        parser.add_argument('--output', help='Файл для сохранения json.')
+
+    def get_paths(self):
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        if recipe is None:
+            raise CommandError(
+                'Нет данных: сначала выполните generate_data.'
+            )
+
+        return {
+            'recipes_list': '/api/recipes/',
+            'recipes_list_tag': '/api/recipes/?tags=breakfast&limit=10',
+            'recipes_detail': f'/api/recipes/{recipe.id}/',
+            'tags_list': '/api/tags/',
+            'ingredients_list': '/api/ingredients/',
+            'subscriptions': '/api/users/subscriptions/',
+        }
+
+    def get_headers(self, anonymous):
+        if anonymous:
+            return {}
+
+        user = User.objects.annotate(
+            follows=Count('follower')
+        ).order_by('-follows').first()
+        token, _ = Token.objects.get_or_create(user=user)
+
+        return {'Authorization': f'Token {token.key}'}
+
+    def load(self, url, headers, count, concurrency):
+        """Латентности (мс), статусы и общее время count запросов
+        из concurrency потоков с keep-alive соединениями.
+        """
+
+        latencies = []
+        statuses = Counter()
+
+        def worker(requests_count):
+            with requests.Session() as session:
+                for _ in range(requests_count):
+                    started = time.perf_counter()
+                    response = session.get(url, headers=headers)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    statuses[response.status_code] += 1
+
+        shares = [
+            count // concurrency + (number < count % concurrency)
+            for number in range(concurrency)
+        ]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(worker, shares))
+
+        return latencies, statuses, time.perf_counter() - started
+
+    def measure(self, base_url, path, headers, options):
+        url = base_url.rstrip('/') + path
+        try:
+            self.load(url, headers, options['warmup'], options['concurrency'])
+        except requests.ConnectionError as error:
+            raise CommandError(f'Сервер {base_url} недоступен: {error}')
+
+        latencies, statuses, duration = self.load(
+            url, headers, options['requests'], options['concurrency']
+        )
+        latencies.sort()
+
+        return {
+            'url': url,
+            'statuses': dict(statuses),
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(
+                latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                3
+            ),
+            'rps': round(len(latencies) / duration, 2),
+        }
+
+    def handle(self, *args, **options):
+        headers = self.get_headers(options['anonymous'])
+
+        results = {}
+        for name, path in self.get_paths().items():
+            results[name] = {
+                server: self.measure(options[server], path, headers, options)
+                for server in ('wsgi', 'asgi')
+            }
+            wsgi, asgi = results[name]['wsgi'], results[name]['asgi']
+            print(
+                f'{name:18} WSGI {wsgi["rps"]:>9} rps '
+                f'p95 {wsgi["p95_ms"]:>8.2f} мс | '
+                f'ASGI {asgi["rps"]:>9} rps '
+                f'p95 {asgi["p95_ms"]:>8.2f} мс | '
+                f'x{asgi["rps"] / max(wsgi["rps"], 1e-9):.2f}'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'created': datetime.now(timezone.utc).isoformat(),
+                    'concurrency': options['concurrency'],
+                    'requests': options['requests'],
+                    'endpoints': results,
+                }, file, ensure_ascii=False, indent=2)
+            print(f'Результаты сохранены в {options["output"]}.')
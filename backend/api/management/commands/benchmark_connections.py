@@ -0,0 +1,154 @@
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Lock
+
+from django.core.management import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from foodgram.postgresql.base import pools
+
+
+class Command(BaseCommand):
+    """Кастомная команда замера накладных расходов на соединения с БД:
+    новое соединение на запрос, постоянные соединения и пул.
+
+    Каждый «запрос» повторяет жизненный цикл запроса Django: сигналы
+    request_started/request_finished и один SQL-запрос между ними.
+    """
+
+    help = 'Бенчмарк переиспользования соединений с БД.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--output', help='Файл для сохранения json.')
+
+    def get_scenarios(self, settings_dict, threads):
+        scenarios = {
+            'new_connection': {'CONN_MAX_AGE': 0, 'POOL': None},
+            'persistent': {
+                'CONN_MAX_AGE': settings_dict['CONN_MAX_AGE'] or 600,
+                'POOL': None,
+            },
+        }
+        if settings_dict['ENGINE'] == 'foodgram.postgresql':
+            scenarios['pool'] = {
+                'CONN_MAX_AGE': 0,
+                'POOL': settings_dict.get('POOL') or {
+                    'MAX_SIZE': threads,
+                    'MAX_IDLE': threads,
+                    'TIMEOUT': 30,
+                    'MAX_LIFETIME': 600,
+                },
+            }
+
+        return scenarios
+
+    def reset(self):
+        connections.close_all()
+        for pool in pools.values():
+            pool.close()
+        pools.clear()
+
+    def run_scenario(self, requests, threads):
+        connection = connections['default']
+        query = (
+            'SELECT pg_backend_pid()' if connection.vendor == 'postgresql'
+            else 'SELECT 1'
+        )
+        latencies = []
+        backends = set()
+        connects = 0
+        lock = Lock()
+
+        def count_connect(**kwargs):
+            nonlocal connects
+            with lock:
+                connects += 1
+
+        def worker(count):
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    request_started.send(sender=self.__class__)
+                    with connections['default'].cursor() as cursor:
+                        cursor.execute(query)
+                        backend = cursor.fetchone()[0]
+                    request_finished.send(sender=self.__class__)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    backends.add(backend)
+            finally:
+                connections.close_all()
+
+        connection_created.connect(count_connect)
+        shares = [
+            requests // threads + (number < requests % threads)
+            for number in range(threads)
+        ]
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(threads) as pool:
+                list(pool.map(worker, shares))
+        finally:
+            connection_created.disconnect(count_connect)
+        duration = time.perf_counter() - started
+
+        latencies.sort()
+        result = {
+            'rps': round(requests / duration, 2),
+            'mean_ms': round(statistics.mean(latencies), 3),
+            'p95_ms': round(
+                latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                3
+            ),
+            'connects': connects,
+        }
+        if connection.vendor == 'postgresql':
+            result['server_connections'] = len(backends)
+
+        return result
+
+    def handle(self, *args, **options):
+        settings_dict = connections.settings['default']
+        original = {
+            key: settings_dict.get(key) for key in ('CONN_MAX_AGE', 'POOL')
+        }
+
+        results = {}
+        try:
+            for name, overrides in self.get_scenarios(
+                    settings_dict, options['threads']
+            ).items():
+                self.reset()
+                settings_dict.update(overrides)
+                results[name] = self.run_scenario(
+                    options['requests'], options['threads']
+                )
+                stats = results[name]
+                print(
+                    f'{name:16} {stats["rps"]:>10} rps  '
+                    f'{stats["mean_ms"]:>8.3f} мс/запрос  '
+                    f'p95 {stats["p95_ms"]:>8.3f} мс  '
+                    f'подключений {stats["connects"]:>6}  '
+                    f'соединений на сервере '
+                    f'{stats.get("server_connections", "-")}'
+                )
+        finally:
+            self.reset()
+            settings_dict.update(original)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'created': datetime.now(timezone.utc).isoformat(),
+                    'database': connections['default'].vendor,
+                    'requests': options['requests'],
+                    'threads': options['threads'],
+                    'scenarios': results,
+                }, file, ensure_ascii=False, indent=2)
+            print(f'Результаты сохранены в {options["output"]}.')
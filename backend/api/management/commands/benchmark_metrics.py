@@ -0,0 +1,93 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from recipes.models import Recipe
+
+MIDDLEWARE = 'api.metrics.RequestMetricsMiddleware'
+
+
+class Command(BaseCommand):
+    """Кастомная команда замера накладных расходов RequestMetricsMiddleware:
+    без middleware, с частотой выборки из настроек и с выборкой всех
+    запросов.
+
+    Сценарии чередуются пачками по --batch запросов, чтобы дрейф
+    машины не попадал в разницу между ними.
+    """
+
+    help = 'Бенчмарк накладных расходов middleware метрик.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--batch', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=20)
+
+    def get_endpoints(self):
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        if recipe is None:
+            raise CommandError('Нет данных: сначала выполните generate_data.')
+
+        return [
+            ('tags_list', '/api/tags/'),
+            ('recipes_list', '/api/recipes/'),
+            ('recipes_detail', f'/api/recipes/{recipe.id}/'),
+        ]
+
+    def get_scenarios(self):
+        middleware = [
+            name for name in settings.MIDDLEWARE if name != MIDDLEWARE
+        ]
+
+        return [
+            ('без middleware', {'MIDDLEWARE': middleware}),
+            (
+                f'выборка {settings.METRICS_SAMPLE_RATE:g}',
+                {'METRICS_SAMPLE_RATE': settings.METRICS_SAMPLE_RATE},
+            ),
+            ('выборка 1', {'METRICS_SAMPLE_RATE': 1.0}),
+        ]
+
+    def run_batch(self, url, overrides, count):
+        latencies = []
+        with override_settings(**overrides):
+            # Цепочка middleware собирается при первом запросе клиента.
+            client = Client()
+            client.get(url)
+            for _ in range(count):
+                started = time.perf_counter()
+                client.get(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        return latencies
+
+    def handle(self, *args, **options):
+        if MIDDLEWARE not in settings.MIDDLEWARE:
+            raise CommandError(f'{MIDDLEWARE} не подключён в MIDDLEWARE.')
+
+        scenarios = self.get_scenarios()
+        batch = options['batch']
+        for name, url in self.get_endpoints():
+            self.run_batch(url, {}, options['warmup'])
+            latencies = {scenario: [] for scenario, _ in scenarios}
+            for _ in range(max(options['requests'] // batch, 1)):
+                for scenario, overrides in scenarios:
+                    latencies[scenario] += self.run_batch(
+                        url, overrides, batch
+                    )
+
+            print(name)
+            baseline = statistics.median(latencies[scenarios[0][0]])
+            for scenario, _ in scenarios:
+                values = sorted(latencies[scenario])
+                p50 = statistics.median(values)
+                p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+                print(
+                    f'  {scenario:16} p50 {p50:>8.3f} мс  '
+                    f'p95 {p95:>8.3f} мс  '
+                    f'прирост p50 {p50 - baseline:>+7.3f} мс '
+                    f'({(p50 - baseline) / baseline * 100:+.1f}%)'
+                )
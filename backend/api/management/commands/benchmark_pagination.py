@@ -0,0 +1,125 @@
+import math
+import statistics
+import time
+
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection
+from django.test import Client
+
+from api.metrics import QueryRecorder
+from api.pagination import RecipePagination
+from recipes.models import Recipe
+
+RECIPES_PER_USER = 5
+
+
+class Command(BaseCommand):
+    """Кастомная команда сравнения первой и дальней страниц ленты
+    рецептов при постраничной пагинации (OFFSET и COUNT) и keyset-
+    пагинации по курсору.
+
+    С --generate недостающие до --rows рецепты создаются через
+    generate_data (по 5 рецептов на юзера, без подписок, избранного
+    и списков покупок).
+    """
+
+    help = 'Бенчмарк пагинации рецептов: первая и дальняя страницы.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--page', type=int, default=10000)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--generate', action='store_true')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def generate(self, rows, seed):
+        missing = rows - Recipe.objects.count()
+        if missing <= 0:
+            return
+
+        call_command(
+            'generate_data',
+            users=math.ceil(missing / RECIPES_PER_USER),
+            recipes_per_user=RECIPES_PER_USER,
+            ingredients_per_recipe=1,
+            follows_per_user=0,
+            favorites_per_user=0,
+            cart_per_user=0,
+            seed=seed,
+        )
+
+    def cursor_for(self, page, limit):
+        """Курсор, с которого keyset-пагинация выдаёт страницу page."""
+
+        if page == 1:
+            return ''
+
+        recipe = Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).only('id', 'pub_date')[(page - 1) * limit - 1]
+
+        return RecipePagination().encode_cursor(recipe)
+
+    def measure(self, client, url, count, warmup):
+        for _ in range(warmup):
+            client.get(url)
+
+        latencies = []
+        queries = []
+        statuses = set()
+        for _ in range(count):
+            recorder = QueryRecorder()
+            started = time.perf_counter()
+            with connection.execute_wrapper(recorder):
+                response = client.get(url)
+            latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(recorder.count)
+            statuses.add(response.status_code)
+
+        latencies.sort()
+
+        return {
+            'p50_ms': statistics.median(latencies),
+            'p95_ms': latencies[
+                min(len(latencies) - 1, int(len(latencies) * 0.95))
+            ],
+            'queries': statistics.mean(queries),
+            'statuses': sorted(statuses),
+        }
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            self.generate(options['rows'], options['seed'])
+
+        page, limit = options['page'], options['limit']
+        rows = Recipe.objects.count()
+        if rows < page * limit:
+            raise CommandError(
+                f'Рецептов {rows}, для страницы {page} нужно не меньше '
+                f'{page * limit}: выполните команду с --generate.'
+            )
+
+        print(f'{rows} рецептов, {limit} на странице.')
+        client = Client()
+        scenarios = [
+            (f'offset, стр. {number}',
+             f'/api/recipes/?page={number}&limit={limit}')
+            for number in (1, page)
+        ] + [
+            (f'cursor, стр. {number}',
+             f'/api/recipes/?limit={limit}&cursor='
+             f'{self.cursor_for(number, limit)}')
+            for number in (1, page)
+        ]
+        for name, url in scenarios:
+            stats = self.measure(
+                client, url, options['requests'], options['warmup']
+            )
+            print(
+                f'{name:20} p50 {stats["p50_ms"]:>9.2f} мс  '
+                f'p95 {stats["p95_ms"]:>9.2f} мс  '
+                f'{stats["queries"]:>5.1f} запросов  '
+                f'статусы {stats["statuses"]}'
+            )
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from api.rendering import recipe_renderer
+from api.serializers import RecipeSerializer
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    """Кастомная команда сравнения процессорного времени рендеринга
+    страниц рецептов сериализатором и из кэша общих представлений.
+    """
+
+    help = 'Бенчмарк рендеринга страниц списка рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=50)
+        parser.add_argument('--page-size', type=int, default=6)
+
+    def measure(self, name, pages, render):
+        started = time.process_time()
+        size = sum(len(render(page)) for page in pages)
+        duration = (time.process_time() - started) * 1000 / len(pages)
+        print(
+            f'{name:24} {duration:>8.3f} мс CPU на страницу, '
+            f'{size // len(pages)} байт'
+        )
+
+        return duration
+
+    def handle(self, *args, **options):
+        user = User.objects.first()
+        if user is None:
+            raise CommandError('Нет данных: сначала выполните generate_data.')
+
+        request = RequestFactory().get('/api/recipes/')
+        request.user = user
+        page_size = options['page_size']
+        queryset = Recipe.objects.with_user_flags(user).order_by(
+            '-pub_date', '-id'
+        )
+        pages = [
+            queryset[number * page_size:(number + 1) * page_size]
+            for number in range(options['pages'])
+        ]
+
+        def serialize(page):
+            return JSONRenderer().render(RecipeSerializer(
+                list(page.with_related()), many=True,
+                context={'request': request},
+            ).data)
+
+        def render(page):
+            return recipe_renderer.render(
+                request, list(page.only('id', 'pub_date', 'updated_at')),
+                'benchmark',
+            )
+
+        baseline = self.measure('RecipeSerializer', pages, serialize)
+        self.measure('Кэш, холодный', pages, render)
+        cached = self.measure('Кэш, тёплый', pages, render)
+        print(f'Экономия CPU: {(1 - cached / baseline) * 100:.0f}%')
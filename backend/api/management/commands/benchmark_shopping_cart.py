@@ -0,0 +1,195 @@
+import multiprocessing
+import resource
+import statistics
+import time
+
+from django.core.management import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Sum
+from django.http import HttpResponse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes.models import (Ingredient, IngredientForRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem)
+from users.models import User
+
+USERNAME = 'benchmark_shopping_cart'
+INGREDIENT_PREFIX = 'benchmark shopping cart '
+
+
+def string_builder(request):
+    """Выдача списка покупок до стриминга: SUM/GROUP BY по рецептам
+    корзины и сборка ответа в одну строку.
+    """
+
+    ingredients_for_show = 'Ваши ингредиенты: '
+
+    ingredients = IngredientForRecipe.objects.filter(
+        recipe__shopping_recipes__user=request.user
+    ).order_by(
+        'ingredient__name'
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        amount=Sum('amount')
+    )
+
+    for ingredient in ingredients:
+        ingredients_for_show += (
+            f'\n{ingredient["ingredient__name"]}'
+            f' {ingredient["amount"]}'
+            f' {ingredient["ingredient__measurement_unit"]}'
+        )
+
+    return HttpResponse(ingredients_for_show, content_type='application')
+
+
+def max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_download(view, user, export_format, results):
+    """Один запрос в дочернем процессе: время до первого байта, полное
+    время и прирост пикового RSS процесса.
+    """
+
+    request = APIRequestFactory().get(
+        '/api/recipes/download_shopping_cart/', {'format': export_format}
+    )
+    request.user = user
+    force_authenticate(request, user)
+
+    rss_before = max_rss_kb()
+    started = time.perf_counter()
+    response = view(request)
+    if response.streaming:
+        chunks = iter(response.streaming_content)
+        size = len(next(chunks, b''))
+        first_byte = time.perf_counter()
+        size += sum(len(chunk) for chunk in chunks)
+    else:
+        first_byte = time.perf_counter()
+        size = len(response.content)
+    finished = time.perf_counter()
+
+    results.put({
+        'ttfb_ms': (first_byte - started) * 1000,
+        'total_ms': (finished - started) * 1000,
+        'bytes': size,
+        'peak_rss_mb': (max_rss_kb() - rss_before) / 1024,
+    })
+
+
+class Command(BaseCommand):
+    """Кастомная команда сравнения выдачи списка покупок сборкой строки
+    и стримингом: время до первого байта и пиковый RSS.
+
+    Каждый запрос выполняется в отдельном процессе, чтобы пиковый RSS
+    одного варианта не скрывал другой. Для замера создаётся юзер со
+    списком покупок из --rows ингредиентов, после замера он удаляется.
+    """
+
+    help = 'Бенчмарк выгрузки списка покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--recipes', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    @transaction.atomic
+    def create_shopping_list(self, rows, recipes_count, batch_size):
+        user = User.objects.create_user(
+            username=USERNAME, email=f'{USERNAME}@example.com'
+        )
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(
+                    name=f'{INGREDIENT_PREFIX}{number:07}',
+                    measurement_unit='г',
+                )
+                for number in range(rows)
+            ),
+            batch_size=batch_size,
+        )
+        ingredient_ids = list(Ingredient.objects.filter(
+            name__startswith=INGREDIENT_PREFIX
+        ).values_list('id', flat=True))
+        recipes = [
+            Recipe.objects.create(
+                author=user,
+                name=f'рецепт {number}',
+                text='бенчмарк',
+                image='recipes/images/benchmark.png',
+                cooking_time=1,
+            )
+            for number in range(recipes_count)
+        ]
+        IngredientForRecipe.objects.bulk_create(
+            (
+                IngredientForRecipe(
+                    recipe=recipes[number % recipes_count],
+                    ingredient_id=ingredient_id,
+                    amount=number % 500 + 1,
+                )
+                for number, ingredient_id in enumerate(ingredient_ids)
+            ),
+            batch_size=batch_size,
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe=recipe) for recipe in recipes
+        )
+        ShoppingListItem.objects.rebuild([user.id])
+
+        return user
+
+    def delete_shopping_list(self):
+        User.objects.filter(username=USERNAME).delete()
+        Ingredient.objects.filter(name__startswith=INGREDIENT_PREFIX).delete()
+
+    def measure(self, view, user, export_format, repeat):
+        context = multiprocessing.get_context('fork')
+        runs = []
+        for _ in range(repeat):
+            connections.close_all()
+            results = context.Queue()
+            process = context.Process(
+                target=run_download,
+                args=(view, user, export_format, results),
+            )
+            process.start()
+            runs.append(results.get())
+            process.join()
+
+        return {
+            key: statistics.median(run[key] for run in runs)
+            for key in runs[0]
+        }
+
+    def handle(self, *args, **options):
+        self.delete_shopping_list()
+        print(f'Создание списка покупок из {options["rows"]} строк ...')
+        user = self.create_shopping_list(
+            options['rows'], options['recipes'], options['batch_size']
+        )
+
+        download = RecipeViewSet.as_view({'get': 'download_shopping_cart'})
+        scenarios = [('строка (до)', string_builder, 'txt')] + [
+            (f'стриминг {export_format}', download, export_format)
+            for export_format in ('txt', 'csv', 'json', 'html')
+        ]
+        try:
+            for name, view, export_format in scenarios:
+                stats = self.measure(
+                    view, user, export_format, options['repeat']
+                )
+                print(
+                    f'{name:16} TTFB {stats["ttfb_ms"]:>9.2f} мс  '
+                    f'всего {stats["total_ms"]:>9.2f} мс  '
+                    f'пиковый RSS +{stats["peak_rss_mb"]:>7.1f} МБ  '
+                    f'{stats["bytes"] / 1024 / 1024:>6.1f} МБ ответа'
+                )
+        finally:
+            connections.close_all()
+            self.delete_shopping_list()
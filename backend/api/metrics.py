@@ -0,0 +1,203 @@
+import asyncio
+import random
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from django.conf import settings
+from django.db import connections
+
+
+class QueryRecorder:
+    """Обёртка выполнения SQL, считающая запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = (0.0, '')
+        self.serialization = 0.0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if duration > self.slowest[0]:
+                self.slowest = (duration, sql)
+
+
+current_recorder = ContextVar('current_recorder', default=None)
+
+
+@contextmanager
+def serialization_timer():
+    """Учитывает время блока как время сериализации замеряемого
+    запроса, без SQL внутри блока и без вложенных замеров.
+    """
+
+    recorder = current_recorder.get()
+    if recorder is None or recorder.serializing:
+        yield
+        return
+
+    recorder.serializing = True
+    start = time.perf_counter()
+    db_start = recorder.duration
+    try:
+        yield
+    finally:
+        recorder.serializing = False
+        recorder.serialization += (
+            time.perf_counter() - start - (recorder.duration - db_start)
+        )
+
+
+def serialized(serializer):
+    """Данные сериализатора с замером времени сериализации."""
+
+    with serialization_timer():
+        return serializer.data
+
+
+class MetricsRegistry:
+    """Накопленные в процессе метрики запросов по view."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._views = defaultdict(lambda: {
+            'requests': 0,
+            'seconds': 0.0,
+            'db_seconds': 0.0,
+            'serialization_seconds': 0.0,
+            'queries': 0,
+            'response_bytes': 0,
+            'slowest_query_seconds': 0.0,
+            'slowest_query': '',
+        })
+
+    def record(self, view, duration, recorder, response_bytes):
+        with self._lock:
+            stats = self._views[view]
+            stats['requests'] += 1
+            stats['seconds'] += duration
+            stats['db_seconds'] += recorder.duration
+            stats['serialization_seconds'] += recorder.serialization
+            stats['queries'] += recorder.count
+            stats['response_bytes'] += response_bytes
+            if recorder.slowest[0] > stats['slowest_query_seconds']:
+                stats['slowest_query_seconds'] = recorder.slowest[0]
+                stats['slowest_query'] = recorder.slowest[1][:500]
+
+    def snapshot(self):
+        with self._lock:
+            return {view: dict(stats) for view, stats in self._views.items()}
+
+    def render_prometheus(self):
+        """Метрики в текстовом формате Prometheus."""
+
+        lines = []
+        for name in ('requests', 'seconds', 'db_seconds',
+                     'serialization_seconds', 'queries', 'response_bytes'):
+            metric = f'foodgram_view_{name}_total'
+            lines.append(f'# TYPE {metric} counter')
+            for view, stats in sorted(self.snapshot().items()):
+                lines.append(f'{metric}{{view="{view}"}} {stats[name]}')
+
+        metric = 'foodgram_view_slowest_query_seconds'
+        lines.append(f'# TYPE {metric} gauge')
+        for view, stats in sorted(self.snapshot().items()):
+            lines.append(
+                f'{metric}{{view="{view}"}} {stats["slowest_query_seconds"]}'
+            )
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """Считает SQL-запросы, время БД, время сериализации и размер ответа
+    для части запросов.
+
+    Результат отдаётся заголовком Server-Timing и копится в registry.
+    Сериализация замеряется там, где выполняется (serialization_timer),
+    и в время приложения (app) не входит.
+    Под ASGI работает асинхронно; запросы асинхронных вьюх, выполненные
+    в потоках пула (api.async_views.run), в счётчик SQL не попадают.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+
+        return self.record(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.METRICS_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+
+        return self.record(request, response, recorder, start)
+
+    def record(self, request, response, recorder, start):
+        duration = time.perf_counter() - start
+
+        response_bytes = (
+            0 if response.streaming else len(response.content)
+        )
+        match = request.resolver_match
+        view = (
+            f'{request.method} {match.view_name}' if match
+            else f'{request.method} unresolved'
+        )
+        registry.record(view, duration, recorder, response_bytes)
+
+        app = duration - recorder.duration - recorder.serialization
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={recorder.duration * 1000:.2f};'
+            f'desc="{recorder.count} queries"',
+            f'ser;dur={recorder.serialization * 1000:.2f}',
+            f'app;dur={app * 1000:.2f}',
+            f'total;dur={duration * 1000:.2f}',
+        ))
+
+        return response
@@ -1,5 +1,163 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes.models import FeedEntry
 
 
 class CustomUserPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class RecipePagination(CustomUserPagination):
+    """Пагинация рецептов.
+
+    По умолчанию постраничная; с параметром cursor (для первой страницы
+    пустым) включается keyset-пагинация по (pub_date, id), без OFFSET.
+    Параметр count=exact|estimate|none управляет подсчётом записей
+    в режиме курсора (по умолчанию не считается).
+    """
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.count = self.get_count(queryset, request)
+
+        queryset = queryset.order_by('-pub_date', '-id')
+        position = self.decode_cursor(request)
+        if position is not None:
+            pub_date, pk = position
+            # pub_date__lte дублирует условие, чтобы планировщик искал
+            # начало страницы по индексу, а не сканировал его с начала.
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk),
+                pub_date__lte=pub_date,
+            )
+
+        page_size = self.get_page_size(request)
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.keyset_page = page[:page_size]
+
+        return self.keyset_page
+
+    def get_count(self, queryset, request):
+        mode = request.query_params.get(self.count_query_param, 'none')
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'estimate':
+            return self.estimate_count(queryset)
+
+        return None
+
+    @staticmethod
+    def estimate_count(queryset):
+        """Оценка количества строк по плану запроса PostgreSQL."""
+
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return queryset.count()
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        return plan[0]['Plan']['Plan Rows']
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param, '')
+        if not encoded:
+            return None
+
+        try:
+            pub_date, pk = urlsafe_b64decode(
+                encoded.encode('ascii')
+            ).decode('ascii').split('|')
+            position = parse_datetime(pub_date), int(pk)
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        return position
+
+    def encode_cursor(self, recipe):
+        position = f'{recipe.pub_date.isoformat()}|{recipe.pk}'
+
+        return urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+
+        if not self.has_next:
+            return None
+
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.keyset_page[-1]),
+        )
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+
+        return None
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+
+class FeedPagination(RecipePagination):
+    """Keyset-пагинация ленты подписок.
+
+    Страница собирается из id рецептов ленты, без подсчёта записей.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = True
+        self.request = request
+        self.count = None
+
+        page_size = self.get_page_size(request)
+        recipe_ids = FeedEntry.objects.recipe_ids_for(
+            request.user, self.decode_cursor(request), page_size + 1
+        )
+        self.has_next = len(recipe_ids) > page_size
+        recipe_ids = recipe_ids[:page_size]
+
+        recipes = queryset.in_bulk(recipe_ids)
+        self.keyset_page = [
+            recipes[pk] for pk in recipe_ids if pk in recipes
+        ]
+
+        return self.keyset_page
@@ -0,0 +1,122 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Recipe
+
+from .metrics import serialization_timer
+from .serializers import RecipeSerializer
+
+USER_FLAGS = ('author_is_subscribed', 'is_favorited', 'is_in_shopping_cart')
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer с замером времени рендеринга в метриках запроса."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with serialization_timer():
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class CachedRecipeRenderer:
+    """Рендеринг рецептов в JSON из кэша общих представлений.
+
+    Общее для всех юзеров представление рецепта хранится в кэше
+    готовыми байтами, разрезанными по местам флагов юзера; флаги
+    подставляются из аннотаций рецептов страницы.
+    """
+
+    renderer = JSONRenderer()
+
+    def __init__(self):
+        token = uuid4().hex
+        self.sentinels = {flag: f'{token}:{flag}' for flag in USER_FLAGS}
+        self.encoded = {
+            flag: self.renderer.render(sentinel)
+            for flag, sentinel in self.sentinels.items()
+        }
+
+    @property
+    def backend(self):
+        return caches[settings.RECIPE_JSON_CACHE_ALIAS]
+
+    @staticmethod
+    def key(request, recipe, version):
+        return (
+            f'recipe_json:{request.scheme}://{request.get_host()}:'
+            f'{recipe.pk}:{recipe.updated_at.timestamp()}:{version}'
+        )
+
+    def split(self, rendered):
+        """Разрезает JSON рецепта по местам флагов:
+        (фрагменты, флаги между ними).
+        """
+
+        positions = sorted(
+            (rendered.index(encoded), flag)
+            for flag, encoded in self.encoded.items()
+        )
+        fragments = []
+        start = 0
+        for position, flag in positions:
+            fragments.append(rendered[start:position])
+            start = position + len(self.encoded[flag])
+        fragments.append(rendered[start:])
+
+        return tuple(fragments), tuple(flag for _, flag in positions)
+
+    def build(self, request, recipe_ids):
+        parts = {}
+        with serialization_timer():
+            recipes = Recipe.objects.with_related().filter(pk__in=recipe_ids)
+            for recipe in recipes:
+                for flag, sentinel in self.sentinels.items():
+                    setattr(recipe, flag, sentinel)
+                parts[recipe.pk] = self.split(self.renderer.render(
+                    RecipeSerializer(recipe, context={'request': request}).data
+                ))
+
+        return parts
+
+    def render(self, request, recipes, version):
+        """JSON-массив рецептов. У recipes должны быть загружены pk,
+        updated_at и аннотации флагов юзера.
+        """
+
+        keys = {
+            recipe.pk: self.key(request, recipe, version)
+            for recipe in recipes
+        }
+        cached = self.backend.get_many(keys.values())
+        parts = {pk: cached[key] for pk, key in keys.items() if key in cached}
+
+        missing = [pk for pk in keys if pk not in parts]
+        if missing:
+            built = self.build(request, missing)
+            self.backend.set_many(
+                {keys[pk]: value for pk, value in built.items()},
+                timeout=settings.RECIPE_JSON_CACHE_TIMEOUT,
+            )
+            parts.update(built)
+
+        items = []
+        with serialization_timer():
+            for recipe in recipes:
+                if recipe.pk not in parts:
+                    continue
+
+                fragments, flags = parts[recipe.pk]
+                chunks = [fragments[0]]
+                for flag, fragment in zip(flags, fragments[1:]):
+                    chunks.append(
+                        b'true' if getattr(recipe, flag) else b'false'
+                    )
+                    chunks.append(fragment)
+                items.append(b''.join(chunks))
+
+        return b'[' + b','.join(items) + b']'
+
+
+recipe_renderer = CachedRecipeRenderer()
@@ -1,22 +1,45 @@
 import base64
+import binascii
 import re
+from collections import Counter
+from tempfile import SpooledTemporaryFile
 
+from django.conf import settings
 from django.contrib.auth import authenticate
-from django.core.files.base import ContentFile
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers
 from rest_framework.relations import PrimaryKeyRelatedField
-from rest_framework.validators import UniqueTogetherValidator
 
+from recipes.images import reset_image_variants, schedule_image_variants
+from recipes.matching import schedule_recipe_index
 from recipes.models import (FavoriteRecipe, Ingredient, IngredientForRecipe,
-                            Recipe, ShoppingCart, Tag)
+                            Recipe, ShoppingCart, ShoppingListItem, Tag)
+from recipes.search import update_recipe_search
 from users.models import Follow, User
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """URL уменьшенных и WebP копий изображения."""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        urls = {}
+        for name, path in value.items():
+            url = default_storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+
+        return urls
+
+
 class AdditionalRecipeSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class CustomUserSerializer(UserCreateSerializer):
@@ -71,6 +94,9 @@ class CustomFollowUserSerializer(CustomUserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -81,6 +107,23 @@ class CustomFollowUserSerializer(CustomUserSerializer):
         ).exists()
 
 
+RECIPES_LIMIT = 3
+
+
+def get_recipes_limit(request):
+    """Количество рецептов автора из параметра recipes_limit."""
+
+    if request is None:
+        return RECIPES_LIMIT
+
+    try:
+        limit = int(request.query_params.get('recipes_limit', RECIPES_LIMIT))
+    except ValueError:
+        return RECIPES_LIMIT
+
+    return max(limit, 0)
+
+
 class SubscriptionsSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField(
         default=False,
@@ -107,6 +150,9 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+
         request = self.context.get('request')
 
         return Follow.objects.filter(
@@ -115,11 +161,16 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
         ).exists()
 
     def get_recipes(self, obj):
-        recipes = Recipe.objects.filter(author=obj)[:3]
+        if hasattr(obj, 'latest_recipes'):
+            recipes = obj.latest_recipes
+        else:
+            limit = get_recipes_limit(self.context.get('request'))
+            recipes = Recipe.objects.filter(author=obj)[:limit]
+
         return AdditionalRecipeSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        return obj.recipes_count
 
 
 class CustomAuthTokenSerializer(serializers.Serializer):
@@ -158,55 +209,53 @@ class CustomAuthTokenSerializer(serializers.Serializer):
         return attrs
 
 
-class FollowSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Follow
-        fields = ('user', 'author')
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=('user', 'author')
-            )
-        ]
-
-    def to_representation(self, instance):
-
-        return SubscriptionsSerializer(
-            instance.author,
-            context={'request': self.context.get('request')}
-        ).data
-
-    def validate(self, data):
-        if Follow.objects.filter(
-                user=data['user'],
-                author=data['author'],
-        ).exists():
-            raise serializers.ValidationError(
-                'Ошибка подписки: Вы уже подписаны на данного пользователя!')
-
-        if data['user'] == data['author']:
-            raise serializers.ValidationError(
-                'Ошибка подписки: нельзя подписаться сам на себя !')
-
-        return data
-
-
 class Base64ImageField(serializers.ImageField):
     """Кастомное поле под изображение."""
 
+    chunk_size = 64 * 1024
+
     def to_internal_value(self, data):
         try:
             if isinstance(data, str) and data.startswith('data:image'):
                 format, imgstr = data.split(';base64,')
                 ext = format.split('/')[-1]
-                data = ContentFile(
-                    base64.b64decode(imgstr),
-                    name='image.' + ext
-                )
-        except ValueError:
+                data = self.decode(imgstr, name='image.' + ext)
+        except (ValueError, binascii.Error):
             raise serializers.ValidationError('Загрузите изображение!')
 
-        return super().to_internal_value(data)
+        image_file = super().to_internal_value(data)
+
+        width, height = image_file.image.size
+        if max(width, height) > settings.IMAGE_MAX_DIMENSION:
+            raise serializers.ValidationError(
+                'Размер изображения не должен превышать '
+                f'{settings.IMAGE_MAX_DIMENSION} пикселей по стороне.'
+            )
+
+        return image_file
+
+    def decode(self, imgstr, name):
+        """Декодирует base64 по частям, не превышая лимит размера."""
+
+        # Переносы строк и пробелы (base64 с разбивкой по 76 символов)
+        # убираются, иначе они сдвигают границы частей.
+        imgstr = ''.join(imgstr.split())
+        padding = len(imgstr) - len(imgstr.rstrip('='))
+        if len(imgstr) * 3 // 4 - padding > settings.IMAGE_MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                'Размер изображения не должен превышать '
+                f'{settings.IMAGE_MAX_UPLOAD_SIZE // 1024} КБ.'
+            )
+
+        decoded = SpooledTemporaryFile(max_size=self.chunk_size)
+        for start in range(0, len(imgstr), self.chunk_size):
+            decoded.write(base64.b64decode(
+                imgstr[start:start + self.chunk_size],
+                validate=True
+            ))
+        decoded.seek(0)
+
+        return File(decoded, name=name)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -225,66 +274,14 @@ class ShowFavoriteRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time')
 
 
-class FavoriteRecipeSerializer(serializers.ModelSerializer):
-    """Сериализатор избранного рецепта."""
-
-    class Meta:
-        model = FavoriteRecipe
-        fields = ('user', 'recipe')
-        validators = [
-            UniqueTogetherValidator(
-                queryset=FavoriteRecipe.objects.all(),
-                fields=('user', 'recipe')
-            )
-        ]
-
-    def to_representation(self, instance):
-        return ShowFavoriteRecipeSerializer(
-            instance.recipe,
-            context={'request': self.context.get('request')}
-        ).data
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для пакетных операций."""
 
-    def validate(self, data):
-        if FavoriteRecipe.objects.filter(
-                user=data['user'],
-                recipe=data['recipe'],
-        ).exists():
-            raise serializers.ValidationError(
-                'Вы уже добавили в избранное данный рецепт!'
-            )
-
-        return data
-
-
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериализатор рецептов из списка покупок."""
-
-    class Meta:
-        model = ShoppingCart
-        fields = ('user', 'recipe')
-        validators = [
-            UniqueTogetherValidator(
-                queryset=ShoppingCart.objects.all(),
-                fields=('user', 'recipe')
-            )
-        ]
-
-    def to_representation(self, instance):
-        return ShowFavoriteRecipeSerializer(
-            instance.recipe,
-            context={'request': self.context.get('request')}
-        ).data
-
-    def validate(self, data):
-        if ShoppingCart.objects.filter(
-                user=data['user'],
-                recipe=data['recipe'],
-        ).exists():
-            raise serializers.ValidationError(
-                'Вы уже добавили в cписок покупок данный рецепт!'
-            )
-
-        return data
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BATCH_MAX_SIZE,
+    )
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -324,14 +321,6 @@ class AddIngredientInRecipe(serializers.ModelSerializer):
         model = IngredientForRecipe
         fields = ('id', 'amount')
 
-    def validate_id(self, value):
-        if not Ingredient.objects.filter(id=value).exists():
-            raise serializers.ValidationError(
-                'Ингредиент с данным id не найден.'
-            )
-
-        return value
-
     def validate_amount(self, value):
         if value <= 0:
             raise serializers.ValidationError(
@@ -356,6 +345,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField()
     tags = TagSerializer(read_only=True, many=True)
     image = Base64ImageField(required=False, allow_null=True)
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField(
         read_only=True,
         default=False
@@ -368,16 +358,26 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = (
-            'id', 'tags', 'image', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'text', 'cooking_time'
+            'id', 'tags', 'image', 'image_variants', 'author', 'ingredients',
+            'is_favorited', 'is_in_shopping_cart', 'name', 'text',
+            'cooking_time'
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+
+        return super().to_representation(instance)
+
     def get_ingredients(self, obj):
-        ingredients = IngredientForRecipe.objects.filter(recipe=obj)
+        ingredients = obj.ingredients_for_recipe.all()
 
         return IngredientInRecipeSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -388,6 +388,9 @@ class RecipeSerializer(serializers.ModelSerializer):
         ).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -447,19 +450,38 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         return value
 
+    def validate_ingredients(self, value):
+        ids = [ingredient['id'] for ingredient in value]
+        found = Ingredient.objects.in_bulk(ids)
+
+        errors = []
+        unknown = sorted({pk for pk in ids if pk not in found})
+        if unknown:
+            errors.append(f'Ингредиенты с id {unknown} не найдены.')
+
+        duplicates = sorted(
+            pk for pk, count in Counter(ids).items() if count > 1
+        )
+        if duplicates:
+            errors.append(f'Ингредиенты с id {duplicates} повторяются.')
+
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        return value
+
     @staticmethod
     def make_ingredient_for_recipe_obj(ingredients, recipe):
-        bulk_data = []
-        for ingredient in ingredients:
-            current_ingredient = Ingredient.objects.get(id=ingredient['id'])
-            bulk_data.append(IngredientForRecipe(
+        return IngredientForRecipe.objects.bulk_create([
+            IngredientForRecipe(
                 recipe=recipe,
-                ingredient=current_ingredient,
+                ingredient_id=ingredient['id'],
                 amount=ingredient['amount'],
-            ))
-
-        return IngredientForRecipe.objects.bulk_create(bulk_data)
+            )
+            for ingredient in ingredients
+        ])
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipes_for_ingredients')
@@ -467,30 +489,92 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags)
 
         self.make_ingredient_for_recipe_obj(ingredients, recipe)
+        update_recipe_search([recipe.pk])
+        schedule_recipe_index(recipe.pk)
+        transaction.on_commit(lambda: schedule_image_variants(recipe.pk))
 
         return recipe
 
-    def update(self, instance, validated_data):
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.image = validated_data.get('image', instance.image)
-        instance.cooking_time = validated_data.get(
-            'cooking_time',
-            instance.cooking_time
-        )
+    @staticmethod
+    def update_ingredient_for_recipe_objs(ingredients, recipe):
+        """Обновляет ингредиенты рецепта по разнице с текущими.
+
+        Возвращает изменение количеств {ingredient_id: delta} по
+        созданным и изменённым строкам: bulk-операции не шлют сигналов,
+        а удалённые строки вычитают из списков покупок сигналы.
+        """
+
+        existing = {
+            item.ingredient_id: item
+            for item in recipe.ingredients_for_recipe.all()
+        }
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+
+        amounts_delta = Counter(new_amounts)
+        amounts_delta.subtract({
+            ingredient_id: item.amount
+            for ingredient_id, item in existing.items()
+            if ingredient_id in new_amounts
+        })
+
+        to_create = []
+        to_update = []
+        for ingredient_id, amount in new_amounts.items():
+            item = existing.get(ingredient_id)
+            if item is None:
+                to_create.append(IngredientForRecipe(
+                    recipe=recipe,
+                    ingredient_id=ingredient_id,
+                    amount=amount,
+                ))
+            elif item.amount != amount:
+                item.amount = amount
+                to_update.append(item)
+
+        to_delete = [
+            item.id for ingredient_id, item in existing.items()
+            if ingredient_id not in new_amounts
+        ]
 
-        instance.tags.clear()
-        tags = validated_data.pop('tags')
-        instance.tags.set(tags)
+        if to_delete:
+            IngredientForRecipe.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            IngredientForRecipe.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            IngredientForRecipe.objects.bulk_create(to_create)
 
-        instance.ingredients.clear()
-        ingredients = validated_data.pop('recipes_for_ingredients')
+        return amounts_delta
 
-        self.make_ingredient_for_recipe_obj(ingredients, instance)
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+
+        ingredients = validated_data.pop('recipes_for_ingredients', None)
+        if ingredients is not None:
+            ShoppingListItem.objects.apply(
+                instance.shopping_recipes.values_list('user', flat=True),
+                self.update_ingredient_for_recipe_objs(ingredients, instance),
+            )
+            schedule_recipe_index(instance.pk)
+
+        if 'image' in validated_data:
+            reset_image_variants(instance)
 
-        instance.save()
+        instance = super().update(instance, validated_data)
+        update_recipe_search([instance.pk])
 
         return instance
 
     def to_representation(self, instance):
-        return RecipeSerializer(instance).data
+        request = self.context.get('request')
+        user = request.user if request else None
+        instance = Recipe.objects.with_related().with_user_flags(user).get(
+            pk=instance.pk
+        )
+
+        return RecipeSerializer(instance, context=self.context).data
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+from .authentication import invalidate_tokens
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields and set(update_fields) <= {'last_login'}:
+        return
+
+    tokens = Token.objects.filter(user=instance)
+    if instance._password is not None:
+        # Пароль сменён через set_password: токены юзера отзываются,
+        # из кэша их убирает token_deleted.
+        tokens.delete()
+        return
+
+    invalidate_tokens(*tokens.values_list('key', flat=True))
@@ -0,0 +1,82 @@
+import os
+import tempfile
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache, token_cache_key
+from users.models import User
+
+ME_URL = '/api/users/me/'
+
+
+class TokenRevocationMixin:
+    """Отозванный токен отклоняется на следующем же запросе."""
+
+    password = 'Old-pass-4821'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password=self.password,
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+
+    def assert_rejected(self):
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
+
+    def test_logout(self):
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_rejected()
+
+    def test_token_delete(self):
+        self.token.delete()
+        self.assert_rejected()
+
+    def test_password_change(self):
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': self.password,
+            'new_password': 'New-pass-9173',
+        })
+        self.assertEqual(response.status_code, 204)
+        self.assert_rejected()
+
+    def test_deactivation(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assert_rejected()
+
+
+class LocalCacheTokenRevocationTest(TokenRevocationMixin, TestCase):
+    """С кэшем процесса токены не кэшируются."""
+
+    def test_token_not_cached(self):
+        self.assertIsNone(token_cache())
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'auth': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'foodgram-auth-test'),
+    },
+})
+class SharedCacheTokenRevocationTest(TokenRevocationMixin, TestCase):
+    """С общим кэшем токены кэшируются и удаляются из кэша при отзыве."""
+
+    def setUp(self):
+        caches['auth'].clear()
+        super().setUp()
+
+    def test_token_cached(self):
+        key = token_cache_key(self.token.key)
+        self.assertIsNotNone(token_cache().get(key))
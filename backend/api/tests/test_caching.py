@@ -0,0 +1,106 @@
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, IngredientForRecipe, Recipe, Tag
+from users.models import User
+
+
+class RecipeChangesTest(TestCase):
+    """Правки ингредиентов и тэгов рецепта в обход формы рецепта
+    попадают в ответы, а не отдаются из кэша.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=User.objects.create_user(
+                username='author', email='author@example.com'
+            ),
+            name='рецепт',
+            text='описание',
+            image='recipes/images/recipe.png',
+            cooking_time=10,
+        )
+        cls.item = IngredientForRecipe.objects.create(
+            recipe=cls.recipe,
+            ingredient=Ingredient.objects.create(
+                name='соль', measurement_unit='г'
+            ),
+            amount=322,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        for cache in caches.all():
+            cache.clear()
+
+    def change(self, action):
+        with self.captureOnCommitCallbacks(execute=True):
+            action()
+
+    def set_amount(self, amount):
+        self.item.amount = amount
+        self.item.save()
+
+    def test_list_ingredient_edit(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(
+            response.json()['results'][0]['ingredients'][0]['amount'], 322
+        )
+
+        self.change(lambda: self.set_amount(1322))
+
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(
+            response.json()['results'][0]['ingredients'][0]['amount'], 1322
+        )
+
+    def test_list_ingredient_delete(self):
+        self.client.get('/api/recipes/')
+
+        self.change(self.item.delete)
+
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.json()['results'][0]['ingredients'], [])
+
+    def test_list_tags_edit(self):
+        self.client.get('/api/recipes/')
+
+        self.change(lambda: self.tag.tags.add(self.recipe))
+
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(
+            [tag['slug'] for tag in response.json()['results'][0]['tags']],
+            ['breakfast'],
+        )
+
+    def assert_detail_etag_changes(self, action):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+
+        self.change(action)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        return response.json()
+
+    def test_detail_ingredient_edit(self):
+        data = self.assert_detail_etag_changes(lambda: self.set_amount(1322))
+
+        self.assertEqual(data['ingredients'][0]['amount'], 1322)
+
+    def test_detail_tags_edit(self):
+        data = self.assert_detail_etag_changes(
+            lambda: self.recipe.tags.add(self.tag)
+        )
+
+        self.assertEqual([tag['slug'] for tag in data['tags']], ['breakfast'])
@@ -0,0 +1,46 @@
+import base64
+import textwrap
+from io import BytesIO
+
+from django.test import SimpleTestCase
+from PIL import Image
+from rest_framework import serializers
+
+from api.serializers import Base64ImageField
+
+
+def data_uri(content, wrap=None):
+    encoded = base64.b64encode(content).decode()
+    if wrap:
+        encoded = '\r\n'.join(textwrap.wrap(encoded, wrap))
+
+    return f'data:image/png;base64,{encoded}'
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    """Поле принимает base64 с переносами строк и отклоняет мусор."""
+
+    def setUp(self):
+        buffer = BytesIO()
+        Image.new('RGB', (64, 64), 'red').save(buffer, format='PNG')
+        self.content = buffer.getvalue()
+        self.field = Base64ImageField()
+
+    def test_plain(self):
+        image = self.field.to_internal_value(data_uri(self.content))
+
+        self.assertEqual(image.image.size, (64, 64))
+
+    def test_line_wrapped(self):
+        for wrap in (76, 7):
+            with self.subTest(wrap=wrap):
+                image = self.field.to_internal_value(
+                    data_uri(self.content, wrap)
+                )
+
+                image.seek(0)
+                self.assertEqual(image.read(), self.content)
+
+    def test_invalid(self):
+        with self.assertRaises(serializers.ValidationError):
+            self.field.to_internal_value('data:image/png;base64,!!!!')
@@ -0,0 +1,81 @@
+import re
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.metrics import registry
+from recipes.models import Ingredient, IngredientForRecipe, Recipe, Tag
+from users.models import User
+
+SERVER_TIMING = re.compile(r'(\w+);dur=([\d.]+)')
+
+
+@override_settings(METRICS_SAMPLE_RATE=1.0)
+class SerializationMetricsTest(TestCase):
+    """Время сериализации отдаётся отдельной записью Server-Timing
+    и копится в registry.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        tag = Tag.objects.create(name='тэг', color='#000000', slug='tag')
+        ingredient = Ingredient.objects.create(
+            name='ингредиент', measurement_unit='г'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author,
+            name='рецепт',
+            text='описание',
+            image='recipes/images/recipe.png',
+            cooking_time=10,
+        )
+        cls.recipe.tags.add(tag)
+        IngredientForRecipe.objects.create(
+            recipe=cls.recipe, ingredient=ingredient, amount=1
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        for cache in caches.all():
+            cache.clear()
+
+    def timings(self, response):
+        return {
+            name: float(duration) for name, duration
+            in SERVER_TIMING.findall(response['Server-Timing'])
+        }
+
+    def assert_serialization_recorded(self, url, view):
+        before = registry.snapshot().get(view, {}).get(
+            'serialization_seconds', 0.0
+        )
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'db', 'ser', 'app', 'total'})
+        self.assertGreater(timings['ser'], 0)
+        self.assertAlmostEqual(
+            timings['db'] + timings['ser'] + timings['app'],
+            timings['total'],
+            delta=0.05,
+        )
+        self.assertGreater(
+            registry.snapshot()[view]['serialization_seconds'], before
+        )
+
+    def test_recipe_list(self):
+        self.assert_serialization_recorded('/api/recipes/', 'GET recipes-list')
+
+    def test_recipe_detail(self):
+        self.assert_serialization_recorded(
+            f'/api/recipes/{self.recipe.pk}/', 'GET recipes-detail'
+        )
+
+    def test_tags(self):
+        self.assert_serialization_recorded('/api/tags/', 'GET tags-list')
@@ -0,0 +1,102 @@
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientForRecipe,
+                            Recipe, ShoppingCart, Tag)
+from users.models import User
+
+
+class RecipeQueryCountTest(TestCase):
+    """Число запросов к БД при выдаче рецептов не зависит от числа
+    рецептов на странице, их тэгов и ингредиентов.
+    """
+
+    sizes = (1, 6)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'тэг {number}',
+                color=f'#00000{number}',
+                slug=f'tag-{number}',
+            )
+            for number in range(max(cls.sizes))
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(max(cls.sizes))
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipes(self, size):
+        """size рецептов с size тэгами и ингредиентами, все в избранном
+        и в списке покупок юзера.
+        """
+
+        Recipe.objects.all().delete()
+        recipes = []
+        for number in range(size):
+            recipe = Recipe.objects.create(
+                author=self.author,
+                name=f'рецепт {number}',
+                text='описание',
+                image='recipes/images/recipe.png',
+                cooking_time=10,
+            )
+            recipe.tags.set(self.tags[:size])
+            IngredientForRecipe.objects.bulk_create(
+                IngredientForRecipe(
+                    recipe=recipe, ingredient=ingredient, amount=100
+                )
+                for ingredient in self.ingredients[:size]
+            )
+            FavoriteRecipe.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+            recipes.append(recipe)
+
+        for cache in caches.all():
+            cache.clear()
+
+        return recipes
+
+    def assert_fixed_queries(self, expected, get_url):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                recipes = self.create_recipes(size)
+                url = get_url(recipes)
+                with self.assertNumQueries(expected):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                if 'results' in response.json():
+                    self.assertEqual(len(response.json()['results']), size)
+
+    def test_list(self):
+        self.assert_fixed_queries(5, lambda recipes: '/api/recipes/')
+
+    def test_retrieve(self):
+        self.assert_fixed_queries(
+            4, lambda recipes: f'/api/recipes/{recipes[0].id}/'
+        )
+
+    def test_favorites_filter(self):
+        self.assert_fixed_queries(
+            5, lambda recipes: '/api/recipes/?is_favorited=1'
+        )
+
+    def test_shopping_cart_filter(self):
+        self.assert_fixed_queries(
+            5, lambda recipes: '/api/recipes/?is_in_shopping_cart=1'
+        )
@@ -0,0 +1,87 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.db import connections
+from django.test import RequestFactory, TransactionTestCase
+from rest_framework.test import APIClient
+
+from api import async_views
+from foodgram import routers
+from recipes.models import Recipe, Tag
+from users.models import User
+
+REPLICA = 'replica_1'
+
+
+class PrimaryReadsTest(TransactionTestCase):
+    """Ответы с ETag читают данные из default, а не с реплики.
+
+    Алиаса реплики нет в connections: любое чтение с неё падает.
+    """
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            routers.PrimaryReplicaRouter,
+            'replicas',
+            new_callable=mock.PropertyMock,
+            return_value=[REPLICA],
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass'
+        )
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            name='рецепт',
+            text='описание',
+            image='recipes/images/recipe.png',
+            cooking_time=10,
+        )
+        routers.unpin()
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_router(self):
+        router = routers.PrimaryReplicaRouter()
+
+        self.assertEqual(router.db_for_read(Recipe), REPLICA)
+        with routers.read_from_primary():
+            self.assertEqual(router.db_for_read(Recipe), 'default')
+        self.assertEqual(router.db_for_read(Recipe), REPLICA)
+
+    def test_views(self):
+        for url in (
+                '/api/recipes/',
+                f'/api/recipes/{self.recipe.pk}/',
+                '/api/tags/',
+                '/api/ingredients/',
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_async_views(self):
+        # Соединения потоков пула закрываются после каждого вызова,
+        # иначе они мешают удалить тестовую БД.
+        patcher = mock.patch.dict(
+            connections.databases['default'], {'CONN_MAX_AGE': 0}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        factory = RequestFactory()
+        for view, url, kwargs in (
+                (async_views.recipes, '/api/recipes/', {}),
+                (
+                    async_views.recipe,
+                    f'/api/recipes/{self.recipe.pk}/',
+                    {'pk': self.recipe.pk},
+                ),
+                (async_views.tags, '/api/tags/', {}),
+        ):
+            with self.subTest(url=url):
+                response = async_to_sync(view)(factory.get(url), **kwargs)
+                self.assertEqual(response.status_code, 200)
@@ -1,9 +1,13 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 
-from .views import (CustomObtainAuthToken, FavoriteAPIView, FollowView,
-                    IngredientViewSet, Logout, RecipeViewSet,
-                    ShoppingCartAPIView, TagViewSet, subscriptions)
+from . import async_views
+from .views import (CustomObtainAuthToken, FavoriteAPIView,
+                    FavoriteBatchAPIView, FollowView, IngredientViewSet,
+                    Logout, RecipeViewSet, ShoppingCartAPIView,
+                    ShoppingCartBatchAPIView, TagViewSet, metrics,
+                    metrics_debug, subscriptions)
 
 router = SimpleRouter()
 router.register(r'recipes', RecipeViewSet, basename='recipes')
@@ -12,6 +16,8 @@ router.register(r'ingredients', IngredientViewSet, basename='ingredients')
 
 
 urlpatterns = [
+    path('metrics/', metrics, name='metrics'),
+    path('metrics/debug/', metrics_debug, name='metrics_debug'),
     path('users/subscriptions/', subscriptions, name='subscriptions'),
     path('users/<int:id>/subscribe/', FollowView.as_view(), name='subscribe'),
     path('auth/token/login/', CustomObtainAuthToken.as_view(), name='login'),
@@ -28,4 +34,31 @@ urlpatterns = [
         ShoppingCartAPIView.as_view(),
         name='shopping_carts'
     ),
+    path(
+        'recipes/favorite/batch/',
+        FavoriteBatchAPIView.as_view(),
+        name='favorite_batch'
+    ),
+    path(
+        'recipes/shopping_cart/batch/',
+        ShoppingCartBatchAPIView.as_view(),
+        name='shopping_carts_batch'
+    ),
 ]
+
+if settings.ASYNC_VIEWS:
+    urlpatterns[:0] = [
+        path('tags/', async_views.tags, name='tags-list'),
+        path('ingredients/', async_views.ingredients, name='ingredients-list'),
+        path('recipes/', async_views.recipes, name='recipes-list'),
+        path(
+            'recipes/<int:pk>/',
+            async_views.recipe,
+            name='recipes-detail'
+        ),
+        path(
+            'users/subscriptions/',
+            async_views.subscriptions,
+            name='subscriptions'
+        ),
+    ]
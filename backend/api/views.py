@@ -1,26 +1,42 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from collections import defaultdict
+from hashlib import md5
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Value
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from recipes.models import (FavoriteRecipe, Ingredient, IngredientForRecipe,
-                            Recipe, ShoppingCart, Tag)
-from users.models import Follow, User
+from foodgram.routers import read_from_primary
+from recipes.cache import (ingredients_cache, recipes_cache, tags_cache,
+                           user_flags_cache, users_cache)
+from recipes.matching import recipe_index
+from recipes.models import FeedEntry, Ingredient, Recipe, ShoppingListItem, Tag
+from recipes.toggles import favorites, follows, shopping_cart
+from users.models import User
 
+from .exporters import EXPORTERS
 from .filters import CustomIngredientFilter, CustomRecipeFilter
-from .pagination import CustomUserPagination
+from .metrics import registry, serialization_timer, serialized
+from .pagination import CustomUserPagination, FeedPagination, RecipePagination
 from .permissions import OwnerOrAdmin
-from .serializers import (CustomAuthTokenSerializer, FavoriteRecipeSerializer,
-                          FollowSerializer, IngredientSerializer,
-                          RecipeCreateSerializer, RecipeSerializer,
-                          ShoppingCartSerializer, SubscriptionsSerializer,
-                          TagSerializer)
+from .rendering import recipe_renderer
+from .serializers import (CustomAuthTokenSerializer, IngredientSerializer,
+                          RecipeCreateSerializer, RecipeIdsSerializer,
+                          RecipeSerializer, ShowFavoriteRecipeSerializer,
+                          SubscriptionsSerializer, TagSerializer,
+                          get_recipes_limit)
 
 
 class CustomObtainAuthToken(ObtainAuthToken):
@@ -45,45 +61,162 @@ class Logout(APIView):
 
 class FollowView(APIView):
     def post(self, request, id):
-        data = {'user': request.user.id, 'author': id}
-        serializer = FollowSerializer(data=data, context={'request': request}
-                                      )
-        if serializer.is_valid():
-            serializer.save()
+        if request.user.id == id:
 
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(
+                'Ошибка подписки: нельзя подписаться сам на себя !',
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        author = get_object_or_404(User, id=id)
+        if not follows.add(request.user.id, author.id):
 
-    def delete(self, request, id):
-        follow = Follow.objects.filter(user=request.user.id, author=id)
+            return Response(
+                'Ошибка подписки: Вы уже подписаны на данного пользователя!',
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        if not follow.exists():
+        author.is_subscribed = True
+        serializer = SubscriptionsSerializer(
+            author,
+            context={'request': request}
+        )
+
+        return Response(serialized(serializer), status=status.HTTP_201_CREATED)
+
+    def delete(self, request, id):
+        if not follows.remove(request.user.id, id):
 
             return Response(
                 'Вы не подписаны на данного автора!',
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        follow.delete()
-
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """Метрики запросов процесса в формате Prometheus."""
+
+    return HttpResponse(
+        registry.render_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_debug(request):
+    """Метрики запросов процесса с текстом самых медленных запросов."""
+
+    return Response(registry.snapshot())
+
+
+def followed_authors(user):
+    """Авторы, на которых подписан юзер."""
+
+    return User.objects.filter(
+        author__user=user
+    ).annotate(
+        is_subscribed=Value(True, output_field=BooleanField()),
+    ).order_by('id')
+
+
+def serialize_subscriptions(request, authors):
+    """Данные подписок с последними рецептами авторов."""
+
+    latest_recipes = defaultdict(list)
+    for recipe in Recipe.objects.latest_for_authors(
+            [author.id for author in authors],
+            get_recipes_limit(request),
+    ):
+        latest_recipes[recipe.author_id].append(recipe)
+
+    for author in authors:
+        author.latest_recipes = latest_recipes[author.id]
+
+    return serialized(SubscriptionsSerializer(
+        authors,
+        many=True,
+        context={'request': request},
+    ))
+
+
 @api_view(['GET'])
 @permission_classes([OwnerOrAdmin])
 def subscriptions(request):
-    follows = User.objects.filter(author__user=request.user)
     paginator = CustomUserPagination()
-    result = paginator.paginate_queryset(follows, request, view=None)
+    result = paginator.paginate_queryset(
+        followed_authors(request.user), request, view=None
+    )
 
-    serializer = SubscriptionsSerializer(
-        result,
-        many=True,
-        context={'request': request},
+    return paginator.get_paginated_response(
+        serialize_subscriptions(request, result)
     )
 
-    return paginator.get_paginated_response(serializer.data)
+
+SHOPPING_CART_CHUNK_SIZE = 2000
+MATCH_MAX_INGREDIENTS = 50
+MATCH_MAX_MISSING = 5
+
+
+def set_validators(response, etag, last_modified, cache_control):
+    """Проставляет ответу ETag, Last-Modified и Cache-Control."""
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+
+    return response
+
+
+def conditional_response(request, etag, last_modified, cache_control, build):
+    """Ответ с ETag/Last-Modified: 304 без вызова build(), если
+    данные у клиента не устарели. build() возвращает ответ.
+    """
+
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified),
+    )
+    if response is None:
+        response = build()
+
+    return set_validators(response, etag, last_modified, cache_control)
+
+
+def recipe_validators(user, name, versions, media_type):
+    """ETag, Last-Modified и Cache-Control представления рецептов.
+
+    Анонимные ответы можно кэшировать в nginx; ответы юзерам
+    содержат их флаги, зависят от версии этих флагов и private.
+    """
+
+    if user.is_authenticated:
+        versions = [*versions, user_flags_cache(user.pk).version()]
+        name = f'{name}-u{user.pk}'
+        cache_control = 'private, no-cache'
+    else:
+        cache_control = f'public, max-age={settings.RECIPE_CACHE_MAX_AGE}'
+
+    digest = md5(f'{media_type}:{versions}'.encode()).hexdigest()
+
+    return f'"{name}-{digest}"', max(versions), cache_control
+
+
+def reference_response(request, cache, build):
+    """Ответ со справочными данными из кэша с ETag/Last-Modified."""
+
+    with read_from_primary():
+        data, version = cache.get_or_build(build)
+
+    return conditional_response(
+        request, f'"{cache.name}-{version}"', version, 'no-cache',
+        lambda: Response(data)
+    )
 
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
@@ -94,6 +227,15 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return reference_response(
+            request,
+            tags_cache,
+            lambda: serialized(
+                self.get_serializer(self.get_queryset(), many=True)
+            )
+        )
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     """Вьюсет для ингредиентов."""
@@ -102,9 +244,21 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     filter_backends = (CustomIngredientFilter,)
-    search_fields = ('name',)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get(CustomIngredientFilter.search_param):
+
+            return super().list(request, *args, **kwargs)
+
+        return reference_response(
+            request,
+            ingredients_cache,
+            lambda: serialized(
+                self.get_serializer(self.get_queryset(), many=True)
+            )
+        )
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
@@ -113,121 +267,364 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (OwnerOrAdmin,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = CustomRecipeFilter
+    pagination_class = RecipePagination
 
     def get_permissions(self):
-        if self.action == 'retrieve' or self.action == 'list':
+        if self.action in ('list', 'retrieve', 'match', 'similar'):
 
             return (AllowAny(),)
 
         return super().get_permissions()
 
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve', 'feed', 'match', 'similar'):
+
+            return Recipe.objects.with_related().with_user_flags(
+                self.request.user
+            )
+
+        return super().get_queryset()
+
     def get_serializer_class(self):
-        if self.action == 'list' or self.action == 'retrieve':
+        if self.action in ('list', 'retrieve', 'feed', 'match', 'similar'):
 
             return RecipeSerializer
 
         return RecipeCreateSerializer
 
+    @staticmethod
+    def shared_versions():
+        """Версии данных, входящих в представление рецепта."""
+
+        return [
+            tags_cache.version(),
+            ingredients_cache.version(),
+            users_cache.version(),
+        ]
+
+    def conditional_response(self, request, name, versions, build):
+        """Ответ с ETag по версиям рецептов и справочников."""
+
+        response = conditional_response(
+            request,
+            *recipe_validators(
+                request.user, name, versions, request.accepted_media_type
+            ),
+            build,
+        )
+        patch_vary_headers(response, ('Authorization',))
+
+        return response
+
+    def render_list(self, request, shared_versions, *args, **kwargs):
+        """Страница рецептов: JSON собирается из кэша общих
+        представлений рецептов и флагов юзера из запроса страницы.
+        """
+
+        if not isinstance(request.accepted_renderer, JSONRenderer):
+
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).select_related(
+            None
+        ).prefetch_related(None).only('id', 'pub_date', 'updated_at')
+        page = self.paginate_queryset(queryset)
+        results = recipe_renderer.render(
+            request, page, ':'.join(map(str, shared_versions))
+        )
+        head, tail = request.accepted_renderer.render(
+            self.paginator.get_paginated_response([]).data
+        ).rsplit(b'[]', 1)
+
+        return HttpResponse(
+            head + results + tail, content_type='application/json'
+        )
+
+    @read_from_primary()
+    def list(self, request, *args, **kwargs):
+        shared_versions = self.shared_versions()
+
+        return self.conditional_response(
+            request,
+            'recipes',
+            [recipes_cache.version(), *shared_versions],
+            lambda: self.render_list(
+                request, shared_versions, *args, **kwargs
+            ),
+        )
+
+    @read_from_primary()
+    def retrieve(self, request, *args, **kwargs):
+        updated_at = get_object_or_404(
+            Recipe.objects.values_list('updated_at', flat=True),
+            pk=kwargs['pk'],
+        )
+        retrieve = super().retrieve
+
+        def build():
+            with serialization_timer():
+                return retrieve(request, *args, **kwargs)
+
+        return self.conditional_response(
+            request,
+            f'recipe-{kwargs["pk"]}',
+            [updated_at.timestamp(), *self.shared_versions()],
+            build,
+        )
+
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        FeedEntry.objects.fan_out(recipe)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        pagination_class=FeedPagination,
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        """Лента рецептов авторов, на которых подписан юзер."""
+
+        page = self.paginate_queryset(self.get_queryset())
+        serializer = self.get_serializer(page, many=True)
+
+        return self.get_paginated_response(serialized(serializer))
+
+    @action(
+        detail=False,
+        methods=['get'],
+        pagination_class=CustomUserPagination,
+    )
+    def match(self, request):
+        """Рецепты, которые можно приготовить из данных ингредиентов,
+        с недостачей не более missing ингредиентов.
+        """
+
+        try:
+            ingredient_ids = {
+                int(value)
+                for param in request.query_params.getlist('ingredients')
+                for value in param.split(',') if value
+            }
+            max_missing = int(request.query_params.get('missing', 0))
+        except ValueError:
+
+            return Response(
+                'Ингредиенты и missing должны быть числами!',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if not ingredient_ids or len(ingredient_ids) > MATCH_MAX_INGREDIENTS:
+
+            return Response(
+                f'Укажите от 1 до {MATCH_MAX_INGREDIENTS} ингредиентов!',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        matches = recipe_index.match(
+            ingredient_ids,
+            min(max(max_missing, 0), MATCH_MAX_MISSING),
+            settings.RECIPE_MATCH_MAX_RESULTS,
+        )
+        page = self.paginate_queryset(matches)
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+
+        data = []
+        for recipe_id, matched, missing in page:
+            if recipe_id not in recipes:
+                continue
+            item = serialized(self.get_serializer(recipes[recipe_id]))
+            item['matched_ingredients'] = matched
+            item['missing_ingredients'] = missing
+            data.append(item)
+
+        return self.get_paginated_response(data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """Похожие рецепты, рассчитанные build_similar_recipes."""
+
+        recipes = self.get_queryset().filter(
+            similar_to__recipe=pk
+        ).order_by('-similar_to__score', '-id')
+
+        return Response(serialized(self.get_serializer(recipes, many=True)))
 
     @action(
         detail=False,
         methods=['get'],
         url_path='download_shopping_cart',
         url_name='download_shopping_cart',
-        serializer_class=RecipeSerializer
+        serializer_class=RecipeSerializer,
+        permission_classes=(IsAuthenticated,)
     )
     def download_shopping_cart(self, request):
         """Функция выдачи ингредиентов из списка покупок. """
 
-        ingredients_for_show = 'Ваши ингредиенты: '
+        export_format = request.query_params.get('format', 'txt')
+        if export_format not in EXPORTERS:
+
+            return Response(
+                f'Неизвестный формат! Доступны: {", ".join(EXPORTERS)}.',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        exporter = EXPORTERS[export_format]()
 
-        ingredients = IngredientForRecipe.objects.filter(
-            recipe__shopping_recipes__user=request.user
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
         ).order_by(
             'ingredient__name'
         ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(
-            amount=Sum('amount')
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        ).iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
+
+        response = StreamingHttpResponse(
+            exporter.stream(ingredients),
+            content_type=exporter.content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{exporter.extension}"'
         )
 
-        for ingredient in ingredients:
-            ingredients_for_show += (
-                f'\n{ingredient["ingredient__name"]}'
-                f' {ingredient["amount"]}'
-                f' {ingredient["ingredient__measurement_unit"]}'
-            )
+        return response
+
+    def perform_content_negotiation(self, request, force=False):
+        if self.action == 'download_shopping_cart':
+            force = True
 
-        return HttpResponse(ingredients_for_show, content_type='application')
+        return super().perform_content_negotiation(request, force)
 
 
 class FavoriteAPIView(APIView):
     """Вью-класс на добавление/удаление рецепта в/из избранное(ого)."""
 
     def post(self, request, id):
-        data = {'user': request.user.id, 'recipe': id}
-        serializer = FavoriteRecipeSerializer(
-            data=data,
-            context={'request': request}
+        recipe = get_object_or_404(
+            Recipe.objects.only('id', 'name', 'image', 'cooking_time'), id=id
         )
+        if not favorites.add(request.user.id, recipe.id):
 
-        if serializer.is_valid():
-            serializer.save()
+            return Response(
+                'Вы уже добавили в избранное данный рецепт!',
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        serializer = ShowFavoriteRecipeSerializer(
+            recipe,
+            context={'request': request}
+        )
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serialized(serializer), status=status.HTTP_201_CREATED)
 
     def delete(self, request, id):
-        selected_bundle = FavoriteRecipe.objects.filter(
-            user=request.user.id,
-            recipe=id
-        )
-
-        if not selected_bundle.exists():
+        if not favorites.remove(request.user.id, id):
 
             return Response(
                 'Данный рецепт не находится в избранном!',
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        selected_bundle.delete()
-
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class ShoppingCartAPIView(APIView):
     """Вью-класс на добавление/удаление рецепта в/из список(а) покупок."""
 
+    @transaction.atomic
     def post(self, request, id):
-        data = {'user': request.user.id, 'recipe': id}
-        serializer = ShoppingCartSerializer(
-            data=data,
-            context={'request': request}
+        recipe = get_object_or_404(
+            Recipe.objects.only('id', 'name', 'image', 'cooking_time'), id=id
         )
+        if not shopping_cart.add(request.user.id, recipe.id):
 
-        if serializer.is_valid():
-            serializer.save()
+            return Response(
+                'Вы уже добавили в cписок покупок данный рецепт!',
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        serializer = ShowFavoriteRecipeSerializer(
+            recipe,
+            context={'request': request}
+        )
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serialized(serializer), status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, id):
-        selected_bundle = ShoppingCart.objects.filter(
-            user=request.user.id,
-            recipe=id,
-        )
-
-        if not selected_bundle.exists():
+        if not shopping_cart.remove(request.user.id, id):
 
             return Response(
                 'Данный рецепт не находится в cписке покупок!',
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        selected_bundle.delete()
-
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class RecipeRelationBatchView(APIView):
+    """Базовый вью-класс пакетного добавления/удаления рецептов.
+
+    Принимает {"recipes": [id, ...]} и возвращает результат по каждому id:
+    added/exists/not_found при добавлении и removed/missing при удалении.
+    """
+
+    toggle = None
+
+    def get_recipe_ids(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return list(dict.fromkeys(serializer.validated_data['recipes']))
+
+    @transaction.atomic
+    def post(self, request):
+        recipe_ids = self.get_recipe_ids(request)
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'cooking_time'
+        ).in_bulk(recipe_ids)
+        created = self.toggle.add_many(request.user.id, list(recipes))
+
+        results = []
+        for recipe_id in recipe_ids:
+            recipe = recipes.get(recipe_id)
+            if recipe is None:
+                results.append({'id': recipe_id, 'status': 'not_found'})
+                continue
+
+            results.append({
+                'id': recipe_id,
+                'status': 'added' if recipe_id in created else 'exists',
+                'recipe': serialized(ShowFavoriteRecipeSerializer(
+                    recipe, context={'request': request}
+                )),
+            })
+
+        return Response({'results': results})
+
+    @transaction.atomic
+    def delete(self, request):
+        recipe_ids = self.get_recipe_ids(request)
+        deleted = self.toggle.remove_many(request.user.id, recipe_ids)
+
+        return Response({'results': [
+            {
+                'id': recipe_id,
+                'status': 'removed' if recipe_id in deleted else 'missing',
+            }
+            for recipe_id in recipe_ids
+        ]})
+
+
+class FavoriteBatchAPIView(RecipeRelationBatchView):
+    """Вью-класс пакетного добавления/удаления рецептов в избранном."""
+
+    toggle = favorites
+
+
+class ShoppingCartBatchAPIView(RecipeRelationBatchView):
+    """Вью-класс пакетного добавления/удаления рецептов в списке покупок."""
+
+    toggle = shopping_cart
@@ -0,0 +1,108 @@
+"""Настройки подключений к БД из переменных окружения.
+
+DB_POOL выбирает способ переиспользования соединений с PostgreSQL:
+- none — постоянные соединения Django на поток (CONN_MAX_AGE);
+- builtin — общий для потоков процесса пул foodgram.postgresql;
+- pgbouncer — внешний пулер в режиме transaction: серверные курсоры
+  отключаются, statement_timeout задаётся на стороне пулера или роли.
+DB_REPLICA_HOSTS — реплики для чтения через foodgram.routers.
+"""
+import os
+
+POSTGRES_ENGINES = (
+    'django.db.backends.postgresql',
+    'django.db.backends.postgresql_psycopg2',
+    'foodgram.postgresql',
+)
+POOL_MODES = ('none', 'builtin', 'pgbouncer')
+
+
+def get_engine():
+    engine = os.getenv('DB_ENGINE', default='foodgram.postgresql')
+    if engine in POSTGRES_ENGINES:
+        return 'foodgram.postgresql'
+
+    return engine
+
+
+def get_pool_mode():
+    mode = os.getenv('DB_POOL', default='none')
+    if mode not in POOL_MODES:
+        raise ValueError(
+            f'DB_POOL должен быть одним из: {", ".join(POOL_MODES)}.'
+        )
+
+    return mode
+
+
+def postgres_options(mode):
+    """Параметры libpq: таймауты подключения и выполнения запросов."""
+
+    options = {
+        'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', default=10)),
+    }
+    statement_timeout = int(os.getenv('DB_STATEMENT_TIMEOUT', default=0))
+    if statement_timeout and mode != 'pgbouncer':
+        options['options'] = f'-c statement_timeout={statement_timeout}'
+
+    return options
+
+
+def replica_hosts():
+    """[(host, port)] из DB_REPLICA_HOSTS вида host[:port],..."""
+
+    hosts = []
+    for address in os.getenv('DB_REPLICA_HOSTS', default='').split(','):
+        if not address.strip():
+            continue
+
+        host, _, port = address.strip().partition(':')
+        hosts.append((host, port or os.getenv('DB_PORT', default=5432)))
+
+    return hosts
+
+
+def database_settings():
+    """Словарь DATABASES: основная БД и реплики для чтения."""
+
+    engine = get_engine()
+    conn_max_age = int(os.getenv('DB_CONN_MAX_AGE', default=60))
+    default = {
+        'ENGINE': engine,
+        'NAME': os.getenv('DB_NAME', default='postgres'),
+        'USER': os.getenv('POSTGRES_USER', default='postgres'),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
+        'HOST': os.getenv('DB_HOST', default='db'),
+        'PORT': os.getenv('DB_PORT', default=5432),
+        'CONN_MAX_AGE': conn_max_age,
+    }
+
+    if engine == 'foodgram.postgresql':
+        mode = get_pool_mode()
+        default['OPTIONS'] = postgres_options(mode)
+        default['HEALTH_CHECKS'] = (
+            os.getenv('DB_HEALTH_CHECKS', default='True') == 'True'
+        )
+        if mode == 'builtin':
+            # Соединение возвращается в пул в конце каждого запроса,
+            # а CONN_MAX_AGE становится временем жизни соединения в пуле.
+            default['CONN_MAX_AGE'] = 0
+            default['POOL'] = {
+                'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', default=10)),
+                'MAX_IDLE': int(os.getenv('DB_POOL_MAX_IDLE', default=5)),
+                'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', default=30)),
+                'MAX_LIFETIME': conn_max_age,
+            }
+        elif mode == 'pgbouncer':
+            default['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+    databases = {'default': default}
+    for number, (host, port) in enumerate(replica_hosts(), start=1):
+        databases[f'replica_{number}'] = {
+            **default,
+            'HOST': host,
+            'PORT': port,
+            'TEST': {'MIRROR': 'default'},
+        }
+
+    return databases
@@ -0,0 +1,192 @@
+import queue
+import threading
+import time
+from functools import partial
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+Database = base.Database
+
+
+class ConnectionPool:
+    """Пул соединений с PostgreSQL, общий для потоков процесса.
+
+    Не больше max_size соединений выдано одновременно; ожидание
+    свободного дольше timeout секунд — OperationalError. Простаивающие
+    соединения сверх max_idle и старше max_lifetime закрываются.
+    """
+
+    def __init__(self, max_size, max_idle, timeout, max_lifetime):
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.idle = queue.LifoQueue()
+        self.created = {}
+
+    def expired(self, connection):
+        return (
+            self.max_lifetime is not None
+            and time.monotonic() - self.created[id(connection)]
+            >= self.max_lifetime
+        )
+
+    @staticmethod
+    def is_usable(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except Database.Error:
+            return False
+
+        return True
+
+    def discard(self, connection):
+        self.created.pop(id(connection), None)
+        try:
+            connection.close()
+        except Database.Error:
+            pass
+
+    def get(self, connect, check=False):
+        """Свободное соединение из пула или новое через connect()."""
+
+        if not self.slots.acquire(timeout=self.timeout):
+            raise Database.OperationalError(
+                f'Нет свободных соединений в пуле за {self.timeout} с.'
+            )
+
+        try:
+            while True:
+                try:
+                    connection = self.idle.get_nowait()
+                except queue.Empty:
+                    break
+
+                if (
+                    connection.closed or self.expired(connection)
+                    or check and not self.is_usable(connection)
+                ):
+                    self.discard(connection)
+                    continue
+
+                return connection
+
+            connection = connect()
+            self.created[id(connection)] = time.monotonic()
+        except BaseException:
+            self.slots.release()
+            raise
+
+        return connection
+
+    def put(self, connection):
+        """Возвращает соединение в пул; закрывает сломанное, устаревшее
+        или лишнее.
+        """
+
+        try:
+            status = connection.get_transaction_status()
+            if status not in (
+                extensions.TRANSACTION_STATUS_IDLE,
+                extensions.TRANSACTION_STATUS_INTRANS,
+                extensions.TRANSACTION_STATUS_INERROR,
+            ):
+                self.discard(connection)
+            else:
+                if status != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+                if (
+                    self.expired(connection)
+                    or self.idle.qsize() >= self.max_idle
+                ):
+                    self.discard(connection)
+                else:
+                    self.idle.put(connection)
+        except Database.Error:
+            self.discard(connection)
+        finally:
+            self.slots.release()
+
+    def close(self):
+        """Закрывает простаивающие соединения."""
+
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Бэкенд PostgreSQL с пулом соединений и проверкой их живости.
+
+    Пул включается ключом POOL в настройках БД (см. foodgram.database);
+    с HEALTH_CHECKS постоянное соединение проверяется при первом
+    использовании в запросе, как CONN_HEALTH_CHECKS в новых Django.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_pending = False
+
+    @property
+    def pool(self):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            return None
+
+        with pools_lock:
+            if self.alias not in pools:
+                pools[self.alias] = ConnectionPool(
+                    max_size=options['MAX_SIZE'],
+                    max_idle=options['MAX_IDLE'],
+                    timeout=options['TIMEOUT'],
+                    max_lifetime=options['MAX_LIFETIME'],
+                )
+
+            return pools[self.alias]
+
+    def get_new_connection(self, conn_params):
+        self.health_check_pending = False
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+
+        return pool.get(
+            partial(super().get_new_connection, conn_params),
+            check=self.settings_dict.get('HEALTH_CHECKS', False),
+        )
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+
+        pool.put(self.connection)
+
+        return None
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_pending = (
+            self.connection is not None
+            and self.settings_dict.get('HEALTH_CHECKS', False)
+        )
+
+    def ensure_connection(self):
+        if (
+            self.health_check_pending
+            and self.connection is not None
+            and not self.in_atomic_block
+        ):
+            self.health_check_pending = False
+            if not self.is_usable():
+                self.close()
+
+        super().ensure_connection()
@@ -0,0 +1,72 @@
+import random
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+state = threading.local()
+primary_reads = ContextVar('primary_reads', default=False)
+
+
+def unpin(**kwargs):
+    state.pinned = False
+
+
+request_started.connect(unpin)
+request_finished.connect(unpin)
+
+
+@contextmanager
+def read_from_primary():
+    """Чтение из default внутри блока.
+
+    Версии, из которых строятся ETag и Last-Modified, меняются после
+    коммита на default; тело ответа, прочитанное с отстающей реплики,
+    закрепилось бы у клиента под новым ETag. Контекстная переменная
+    видна и в потоках пула асинхронных вьюх.
+    """
+
+    token = primary_reads.set(True)
+    try:
+        yield
+    finally:
+        primary_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Чтение с реплик (replica_N в DATABASES), запись в default.
+
+    После первой записи и внутри транзакции поток до конца запроса
+    читает из default, чтобы видеть свои изменения без задержки
+    репликации; внутри read_from_primary() — тоже.
+    """
+
+    @property
+    def replicas(self):
+        return [alias for alias in settings.DATABASES if alias != 'default']
+
+    def db_for_read(self, model, **hints):
+        replicas = self.replicas
+        if (
+            not replicas
+            or getattr(state, 'pinned', False)
+            or primary_reads.get()
+            or connections['default'].in_atomic_block
+        ):
+            return 'default'
+
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state.pinned = True
+
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
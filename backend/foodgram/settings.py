@@ -2,6 +2,8 @@ import os
 
 from dotenv import load_dotenv
 
+from .database import database_settings
+
 load_dotenv()
 
 AUTH_USER_MODEL = 'users.User'
@@ -13,7 +15,7 @@ SECRET_KEY = os.getenv(
     default='g+s^((1bj2n33!8e8xrjag+@gdlf3@a2u*8%w1*0uc$*a%&d1!'
 )
 
-DEBUG = True
+DEBUG = os.getenv('DEBUG', default='False') == 'True'
 
 ALLOWED_HOSTS = ['*']
 
@@ -35,6 +37,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -46,6 +49,9 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'foodgram.urls'
 
+# Асинхронные версии читающих эндпоинтов; включается в foodgram/asgi.py.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', default='False') == 'True'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -65,17 +71,44 @@ TEMPLATES = [
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
 
-DATABASES = {
+DATABASES = database_settings()
+DATABASE_ROUTERS = ['foodgram.routers.PrimaryReplicaRouter']
+
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND',
+    default='django.core.cache.backends.locmem.LocMemCache'
+)
+
+CACHES = {
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE', default='django.db.backends.postgresql'),
-        'NAME': os.getenv('DB_NAME', default='postgres'),
-        'USER': os.getenv('POSTGRES_USER', default='postgres'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
-        'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default=5432),
-    }
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    },
+    # Токены кэшируются, только если кэш общий для воркеров (не
+    # LocMemCache), иначе отзыв токена не дошёл бы до других процессов.
+    'auth': {
+        'BACKEND': os.getenv('AUTH_CACHE_BACKEND', default=CACHE_BACKEND),
+        'LOCATION': os.getenv(
+            'AUTH_CACHE_LOCATION',
+            default=os.getenv('CACHE_LOCATION') or 'auth'
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('AUTH_CACHE_MAX_ENTRIES', default=10000)
+            ),
+        },
+    },
 }
 
+REFERENCE_CACHE_ALIAS = os.getenv('REFERENCE_CACHE_ALIAS', default='default')
+AUTH_TOKEN_CACHE_ALIAS = os.getenv('AUTH_TOKEN_CACHE_ALIAS', default='auth')
+AUTH_TOKEN_CACHE_TIMEOUT = int(
+    os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', default=5 * 60)
+)
+REFERENCE_CACHE_TIMEOUT = int(
+    os.getenv('REFERENCE_CACHE_TIMEOUT', default=24 * 60 * 60)
+)
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -110,6 +143,14 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+IMAGE_MAX_UPLOAD_SIZE = int(
+    os.getenv('IMAGE_MAX_UPLOAD_SIZE', default=5 * 1024 * 1024)
+)
+IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', default=6000))
+IMAGE_THUMBNAIL_SIZE = int(os.getenv('IMAGE_THUMBNAIL_SIZE', default=480))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+IMAGE_VARIANTS_SYNC = os.getenv('IMAGE_VARIANTS_SYNC', default='') == 'True'
+
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -119,13 +160,36 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.rendering.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ]
 }
 
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', default=0.1))
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default=1000))
+FEED_MAX_LENGTH = int(os.getenv('FEED_MAX_LENGTH', default=500))
+FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', default=2000))
+
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', default='russian')
+RECIPE_CACHE_MAX_AGE = int(os.getenv('RECIPE_CACHE_MAX_AGE', default=30))
+RECIPE_JSON_CACHE_ALIAS = os.getenv('RECIPE_JSON_CACHE_ALIAS', default='default')
+RECIPE_JSON_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_JSON_CACHE_TIMEOUT', default=24 * 60 * 60)
+)
+
+RECIPE_INDEX_REFRESH = int(os.getenv('RECIPE_INDEX_REFRESH', default=60))
+RECIPE_MATCH_MAX_RESULTS = int(
+    os.getenv('RECIPE_MATCH_MAX_RESULTS', default=1000)
+)
+RECIPE_BATCH_MAX_SIZE = int(os.getenv('RECIPE_BATCH_MAX_SIZE', default=100))
+
 
 DJOSER = {
     'HIDE_USERS': False,
@@ -1,7 +1,10 @@
 from django.contrib import admin
 
+from .images import reset_image_variants
+from .matching import schedule_recipe_index
 from .models import (FavoriteRecipe, Ingredient, IngredientForRecipe, Recipe,
-                     ShoppingCart, Tag)
+                     ShoppingCart, ShoppingListItem, SimilarRecipe, Tag)
+from .search import update_recipe_search
 
 
 class TagInLine(admin.TabularInline):
@@ -49,10 +52,21 @@ class RecipeAdmin(admin.ModelAdmin):
         'author',
         'tags',
     )
+    readonly_fields = ('image_variants',)
     inlines = [TagInLine, IngredientInLine]
 
     def favorite(self, obj):
-        return FavoriteRecipe.objects.filter(recipe=obj).count()
+        return obj.favorites_count
+
+    def save_model(self, request, obj, form, change):
+        if 'image' in form.changed_data:
+            reset_image_variants(obj)
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        update_recipe_search([form.instance.pk])
+        schedule_recipe_index(form.instance.pk)
 
 
 @admin.register(IngredientForRecipe)
@@ -84,3 +98,25 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'recipe',
     )
     search_fields = ('user',)
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'user',
+        'ingredient',
+        'amount',
+    )
+    search_fields = ('user',)
+
+
+@admin.register(SimilarRecipe)
+class SimilarRecipeAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'recipe',
+        'similar',
+        'score',
+    )
+    search_fields = ('recipe__name',)
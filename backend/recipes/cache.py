@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class VersionedCache:
+    """Версионированный кэш справочных данных.
+
+    Версия хранится в общем кэше Django и меняется при каждом изменении
+    данных; данные кэшируются по версии в общем кэше и в LRU процесса.
+    """
+
+    def __init__(self, name, local_size=4):
+        self.name = name
+        self.local_size = local_size
+        self._local = OrderedDict()
+        self._lock = Lock()
+
+    @property
+    def backend(self):
+        return caches[settings.REFERENCE_CACHE_ALIAS]
+
+    @property
+    def version_key(self):
+        return f'reference:{self.name}:version'
+
+    def data_key(self, version):
+        return f'reference:{self.name}:{version}'
+
+    def version(self):
+        """Текущая версия: время последнего изменения данных."""
+
+        version = self.backend.get(self.version_key)
+        if version is None:
+            self.backend.add(self.version_key, time.time(), timeout=None)
+
+            return self.backend.get(self.version_key)
+
+        return version
+
+    def invalidate(self, *args, **kwargs):
+        self.backend.set(self.version_key, time.time(), timeout=None)
+
+    def get_or_build(self, build):
+        """Возвращает (данные, версия), вызывая build() при промахе."""
+
+        version = self.version()
+
+        with self._lock:
+            if version in self._local:
+                self._local.move_to_end(version)
+
+                return self._local[version], version
+
+        data = self.backend.get(self.data_key(version))
+        if data is None:
+            data = build()
+            self.backend.set(
+                self.data_key(version),
+                data,
+                timeout=settings.REFERENCE_CACHE_TIMEOUT
+            )
+
+        with self._lock:
+            self._local[version] = data
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+        return data, version
+
+
+tags_cache = VersionedCache('tags')
+ingredients_cache = VersionedCache('ingredients')
+recipe_ingredients_cache = VersionedCache('recipe_ingredients')
+recipes_cache = VersionedCache('recipes')
+users_cache = VersionedCache('users')
+
+
+def user_flags_cache(user_id):
+    """Версия избранного, списка покупок и подписок юзера."""
+
+    return VersionedCache(f'user_flags:{user_id}')
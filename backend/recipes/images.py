@@ -0,0 +1,116 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from .cache import recipes_cache
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    'thumbnail': (settings.IMAGE_THUMBNAIL_SIZE, 'JPEG', 'jpg'),
+    'thumbnail_webp': (settings.IMAGE_THUMBNAIL_SIZE, 'WEBP', 'webp'),
+    'webp': (None, 'WEBP', 'webp'),
+}
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_WORKERS,
+    thread_name_prefix='recipe-images',
+)
+
+
+def render_variant(image, size, image_format):
+    variant = image.copy()
+    if size is not None:
+        variant.thumbnail((size, size))
+    if image_format == 'JPEG' and variant.mode not in ('RGB', 'L'):
+        variant = variant.convert('RGB')
+
+    buffer = BytesIO()
+    variant.save(buffer, format=image_format, quality=85)
+
+    return buffer.getvalue()
+
+
+def make_image_variants(recipe_id):
+    """Создаёт уменьшенные и WebP копии изображения рецепта."""
+
+    close_old_connections()
+    try:
+        recipe = Recipe.objects.only('image').get(pk=recipe_id)
+        source = recipe.image.name
+        stem = os.path.splitext(source)[0]
+
+        with default_storage.open(source) as image_file:
+            image = Image.open(image_file)
+            image.load()
+
+        variants = {}
+        for name, (size, image_format, extension) in VARIANTS.items():
+            variants[name] = default_storage.save(
+                f'{stem}_{name}.{extension}',
+                ContentFile(render_variant(image, size, image_format)),
+            )
+
+        updated = Recipe.objects.filter(pk=recipe_id, image=source).update(
+            image_variants=variants,
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            # Изображение сменилось во время обработки: копии устарели.
+            delete_image_variants(variants.values())
+
+            return
+
+        recipes_cache.invalidate()
+    except Exception:
+        logger.exception('Не удалось обработать изображение рецепта %s',
+                         recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_image_variants(recipe_id):
+    """Ставит обработку изображения рецепта в фоновую очередь."""
+
+    if settings.IMAGE_VARIANTS_SYNC:
+        make_image_variants(recipe_id)
+
+        return
+
+    executor.submit(make_image_variants, recipe_id)
+
+
+def delete_image_variants(names):
+    """Удаляет файлы копий изображения из хранилища."""
+
+    for name in names:
+        try:
+            default_storage.delete(name)
+        except OSError:
+            logger.exception('Не удалось удалить копию изображения %s', name)
+
+
+def reset_image_variants(recipe):
+    """Сбрасывает копии изображения рецепта при смене изображения.
+
+    Вызывается до сохранения рецепта; после коммита файлы прежних копий
+    удаляются, а копии нового изображения ставятся в очередь.
+    """
+
+    old_variants = list(recipe.image_variants.values())
+    recipe.image_variants = {}
+
+    def replace_variants():
+        delete_image_variants(old_variants)
+        schedule_image_variants(recipe.pk)
+
+    transaction.on_commit(replace_variants)
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.models import FeedEntry
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    """Кастомная команда заполнения лент подписок по существующим
+    подпискам и рецептам.
+    """
+
+    help = 'Заполнение лент подписок юзеров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить существующие записи лент перед заполнением.',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        follows = Follow.objects.filter(
+            author__followers_count__lte=settings.FEED_FANOUT_LIMIT
+        ).values_list('user', 'author').order_by('user')
+
+        with transaction.atomic():
+            if options['clear']:
+                FeedEntry.objects.all().delete()
+
+            processed = 0
+            for user_id, author_id in follows.iterator():
+                FeedEntry.objects.fill(user_id, author_id, trim=False)
+                processed += 1
+                if processed % 1000 == 0:
+                    print(f'Обработано подписок: {processed}')
+
+            FeedEntry.objects.trim()
+
+        print(
+            f'Готово: обработано подписок {processed}, записей в лентах '
+            f'{FeedEntry.objects.count()} за '
+            f'{time.perf_counter() - started:.2f} с.'
+        )
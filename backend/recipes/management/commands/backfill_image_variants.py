@@ -0,0 +1,78 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand
+
+from recipes.images import VARIANTS, delete_image_variants, make_image_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Кастомная команда создания недостающих копий изображений рецептов.
+
+    Нужна для рецептов, созданных до появления копий (image_variants={}),
+    и для задач фоновой очереди, потерянных при перезапуске.
+    """
+
+    help = 'Создание недостающих копий изображений рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check-files',
+            action='store_true',
+            help='Пересоздать и копии, файлов которых нет в хранилище.',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии всех рецептов.',
+        )
+
+    @staticmethod
+    def is_complete(variants, check_files):
+        if set(variants) != set(VARIANTS):
+            return False
+
+        return not check_files or all(
+            default_storage.exists(name) for name in variants.values()
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        recipes = Recipe.objects.order_by('id').values_list(
+            'id', 'image_variants'
+        )
+
+        # Список собирается заранее: make_image_variants закрывает
+        # соединение с БД, а вместе с ним и курсор итератора.
+        pending = [
+            (recipe_id, variants)
+            for recipe_id, variants in recipes.iterator(chunk_size=2000)
+            if options['all'] or not self.is_complete(
+                variants, options['check_files']
+            )
+        ]
+        print(f'Рецептов без копий изображения: {len(pending)}')
+
+        rebuilt = failed = 0
+        for recipe_id, variants in pending:
+            make_image_variants(recipe_id)
+            new_variants = Recipe.objects.values_list(
+                'image_variants', flat=True
+            ).get(pk=recipe_id)
+            if new_variants == variants:
+                failed += 1
+                continue
+
+            # Прежние файлы копий больше ни на что не ссылаются.
+            delete_image_variants(
+                set(variants.values()) - set(new_variants.values())
+            )
+            rebuilt += 1
+            if rebuilt % 100 == 0:
+                print(f'Обработано рецептов: {rebuilt}')
+
+        print(
+            f'Готово: копии созданы для {rebuilt} рецептов, ошибок '
+            f'{failed} за {time.perf_counter() - started:.2f} с.'
+        )
@@ -0,0 +1,124 @@
+import random
+import statistics
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.cache import ingredients_cache
+from recipes.models import Ingredient
+from recipes.search import search_ingredients
+
+MEASUREMENT_UNIT = 'бенчмарк'
+
+
+class Command(BaseCommand):
+    """Кастомная команда замера автодополнения ингредиентов на
+    справочниках разного размера.
+
+    Справочник дополняется до каждого из --sizes строк названиями
+    вида «<настоящее название> <номер>» внутри транзакции, которая
+    откатывается после замера. Запросы — начала и середины настоящих
+    названий; для сравнения замеряется прежний поиск icontains без
+    ранжирования и лимита.
+    """
+
+    help = 'Бенчмарк автодополнения ингредиентов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[2000, 200000]
+        )
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def sample_queries(self, rng, names, count):
+        queries = []
+        for _ in range(count):
+            name = rng.choice(names).lower()
+            length = rng.randint(2, 4)
+            start = 0
+            if rng.random() < 0.3 and len(name) > length:
+                start = rng.randrange(len(name) - length)
+            queries.append(name[start:start + length])
+
+        return queries
+
+    def fill(self, names, size, batch_size):
+        missing = size - Ingredient.objects.count()
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(
+                    name=f'{names[number % len(names)]} {number}',
+                    measurement_unit=MEASUREMENT_UNIT,
+                )
+                for number in range(max(missing, 0))
+            ),
+            batch_size=batch_size,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Ingredient._meta.db_table}')
+        ingredients_cache.invalidate()
+
+    def measure(self, queries, search):
+        latencies = []
+        found = 0
+        for query in queries:
+            started = time.perf_counter()
+            found += len(search(query))
+            latencies.append((time.perf_counter() - started) * 1000)
+
+        latencies.sort()
+
+        return (
+            statistics.median(latencies),
+            latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            found / len(queries),
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('Нет ингредиентов: выполните load_data.')
+
+        queries = self.sample_queries(rng, names, options['queries'])
+        limit = options['limit']
+
+        def search(query):
+            return list(search_ingredients(
+                Ingredient.objects.all(), query, limit
+            ))
+
+        def search_before(query):
+            return list(Ingredient.objects.filter(name__icontains=query))
+
+        try:
+            with transaction.atomic():
+                for size in sorted(options['sizes']):
+                    self.fill(names, size, options['batch_size'])
+                    started = time.perf_counter()
+                    search(queries[0])
+                    first = (time.perf_counter() - started) * 1000
+
+                    rows = Ingredient.objects.count()
+                    print(
+                        f'{rows} строк, первый запрос (с построением '
+                        f'индекса) {first:.1f} мс'
+                    )
+                    for name, function in (
+                            ('ранжированный', search),
+                            ('icontains (до)', search_before),
+                    ):
+                        p50, p95, found = self.measure(queries, function)
+                        print(
+                            f'  {name:16} p50 {p50:>8.3f} мс  '
+                            f'p95 {p95:>8.3f} мс  найдено в среднем '
+                            f'{found:.1f}'
+                        )
+
+                transaction.set_rollback(True)
+        finally:
+            ingredients_cache.invalidate()
@@ -0,0 +1,93 @@
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from django.core.management import BaseCommand, CommandError
+
+from recipes.matching import recipe_index
+from recipes.models import Ingredient, IngredientForRecipe, Recipe
+
+
+class Command(BaseCommand):
+    """Кастомная команда замера построения инвертированного индекса
+    ингредиентов и подбора рецептов по набору ингредиентов.
+
+    Набор ингредиентов запроса — объединение ингредиентов --recipes
+    случайных рецептов без --drop ингредиентов каждого и --extra
+    случайных ингредиентов, так что при missing >= drop подбор находит
+    хотя бы эти рецепты.
+    """
+
+    help = 'Микробенчмарк подбора рецептов по ингредиентам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2)
+        parser.add_argument('--extra', type=int, default=3)
+        parser.add_argument('--drop', type=int, default=0)
+        parser.add_argument('--max-missing', type=int, default=2)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def sample_queries(self, rng, options):
+        recipe_ids = list(Recipe.objects.filter(
+            ingredients_for_recipe__isnull=False
+        ).distinct().values_list('id', flat=True))
+        if not recipe_ids:
+            raise CommandError('Нет рецептов: выполните generate_data.')
+
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        sampled = [
+            rng.sample(recipe_ids, min(options['recipes'], len(recipe_ids)))
+            for _ in range(options['queries'])
+        ]
+        recipe_ingredients = defaultdict(list)
+        for recipe_id, ingredient_id in IngredientForRecipe.objects.filter(
+            recipe__in={pk for recipes in sampled for pk in recipes}
+        ).values_list('recipe', 'ingredient').iterator():
+            recipe_ingredients[recipe_id].append(ingredient_id)
+
+        return [
+            set().union(*(
+                recipe_ingredients[pk][options['drop']:] for pk in recipes
+            )).union(
+                rng.sample(
+                    ingredient_ids, min(options['extra'], len(ingredient_ids))
+                )
+            )
+            for recipes in sampled
+        ]
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        queries = self.sample_queries(rng, options)
+
+        started = time.perf_counter()
+        index = recipe_index.build()
+        print(
+            f'Индекс построен за {time.perf_counter() - started:.2f} с: '
+            f'{len(index.postings)} ингредиентов, '
+            f'{index.memory_size() / 1024 / 1024:.1f} МБ.'
+        )
+
+        print(
+            f'Ингредиентов в запросе в среднем '
+            f'{statistics.mean(map(len, queries)):.1f}.'
+        )
+        for max_missing in range(options['max_missing'] + 1):
+            latencies = []
+            found = 0
+            for query in queries:
+                query_started = time.perf_counter()
+                found += len(index.match(query, max_missing))
+                latencies.append(
+                    (time.perf_counter() - query_started) * 1000
+                )
+
+            latencies.sort()
+            print(
+                f'missing={max_missing}: '
+                f'p50 {statistics.median(latencies):.3f} мс, '
+                f'p95 {latencies[int(len(latencies) * 0.95)]:.3f} мс, '
+                f'найдено в среднем {found / len(queries):.1f}'
+            )
@@ -0,0 +1,246 @@
+import resource
+import time
+from datetime import timedelta
+from itertools import chain
+
+import numpy as np
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import (FavoriteRecipe, IngredientForRecipe, Recipe,
+                            SimilarRecipe)
+from recipes.similarity import SparseCosine, chunks, top_neighbours
+
+MIN_COMMON = 1000
+
+
+class Command(BaseCommand):
+    """Кастомная команда расчёта похожих рецептов.
+
+    Сходство — взвешенная сумма косинусов по ингредиентам (с весами idf)
+    и по юзерам, добавившим рецепты в избранное. Считается частями,
+    ограниченными по числу промежуточных пар.
+    """
+
+    help = 'Расчёт похожих рецептов (полный или для новых рецептов).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=20)
+        parser.add_argument(
+            '--favorites-weight',
+            type=float,
+            default=0.5,
+            help='Вес сходства по избранному, остальное — по ингредиентам.',
+        )
+        parser.add_argument(
+            '--max-df',
+            type=float,
+            default=0.02,
+            help='Не учитывать признаки, встречающиеся в большей доле '
+                 'рецептов (но не менее чем в MIN_COMMON рецептах).',
+        )
+        parser.add_argument(
+            '--max-pairs',
+            type=int,
+            default=5_000_000,
+            help='Максимум промежуточных пар в одной части.',
+        )
+        parser.add_argument(
+            '--since',
+            type=float,
+            help='Пересчитать только рецепты, изменённые за последние '
+                 'N часов, и связанные с ними.',
+        )
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            nargs='+',
+            help='Пересчитать только рецепты с указанными id '
+                 'и связанные с ними.',
+        )
+
+    def stage(self, name):
+        print(
+            f'{name}: {time.perf_counter() - self.started:.2f} с, '
+            f'пик памяти {self.peak_memory():.0f} МБ'
+        )
+
+    @staticmethod
+    def peak_memory():
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    @staticmethod
+    def load_pairs(queryset):
+        pairs = np.fromiter(
+            chain.from_iterable(queryset.iterator(chunk_size=10000)),
+            dtype=np.int64,
+        )
+
+        return pairs[0::2], pairs[1::2]
+
+    def matrix(self, recipe_ids, recipes, features, max_df, idf):
+        """SparseCosine по парам (id рецепта, признак)."""
+
+        items = np.searchsorted(recipe_ids, recipes)
+        features, features_inverse = np.unique(features, return_inverse=True)
+        frequency = np.bincount(features_inverse)
+        common = frequency > max(max_df * len(recipe_ids), MIN_COMMON)
+        keep = ~common[features_inverse]
+        weights = (
+            np.log(len(recipe_ids) / frequency) if idf
+            else np.ones(len(frequency))
+        )[features_inverse[keep]]
+
+        return SparseCosine(
+            items[keep], features_inverse[keep], weights, len(recipe_ids)
+        )
+
+    @staticmethod
+    def changed_recipes(options):
+        """Рецепты для частичного пересчёта или None для полного."""
+
+        if options['recipes']:
+            return Recipe.objects.filter(id__in=options['recipes'])
+        if options['since'] is not None:
+            return Recipe.objects.filter(
+                updated_at__gte=(
+                    timezone.now() - timedelta(hours=options['since'])
+                )
+            )
+
+        return None
+
+    @staticmethod
+    def positions(recipe_ids, queryset):
+        """Позиции в recipe_ids для id из queryset."""
+
+        selected = np.intersect1d(
+            np.fromiter(queryset.iterator(), dtype=np.int64), recipe_ids
+        )
+
+        return np.searchsorted(recipe_ids, selected)
+
+    def save(self, recipe_ids, items, rows, others, scores):
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(
+                recipe__in=recipe_ids[items].tolist()
+            ).delete()
+            SimilarRecipe.objects.bulk_create(
+                (
+                    SimilarRecipe(
+                        recipe_id=recipe_id, similar_id=similar_id,
+                        score=score,
+                    )
+                    for recipe_id, similar_id, score in zip(
+                        recipe_ids[rows].tolist(),
+                        recipe_ids[others].tolist(),
+                        scores.tolist(),
+                    )
+                ),
+                batch_size=5000,
+            )
+
+    def handle(self, *args, **options):
+        self.started = time.perf_counter()
+
+        recipe_ids = np.fromiter(
+            Recipe.objects.order_by('id').values_list(
+                'id', flat=True
+            ).iterator(chunk_size=10000),
+            dtype=np.int64,
+        )
+        if not len(recipe_ids):
+            print('Нет рецептов.')
+            return
+
+        recipes, ingredients = self.load_pairs(
+            IngredientForRecipe.objects.order_by().values_list(
+                'recipe', 'ingredient'
+            )
+        )
+        ingredient_matrix = self.matrix(
+            recipe_ids, recipes, ingredients, options['max_df'], idf=True
+        )
+        recipes, users = self.load_pairs(
+            FavoriteRecipe.objects.order_by().values_list('recipe', 'user')
+        )
+        favorite_matrix = self.matrix(
+            recipe_ids, recipes, users, options['max_df'], idf=False
+        )
+        del recipes, ingredients, users
+        matrices_size = ingredient_matrix.nbytes + favorite_matrix.nbytes
+        self.stage(
+            f'Матрицы загружены ({len(recipe_ids)} рецептов, '
+            f'{matrices_size / 2 ** 20:.1f} МБ)'
+        )
+
+        matrices = (
+            (ingredient_matrix, 1 - options['favorites_weight']),
+            (favorite_matrix, options['favorites_weight']),
+        )
+        costs = ingredient_matrix.costs() + favorite_matrix.costs()
+
+        changed = self.changed_recipes(options)
+        if changed is None:
+            targets = np.arange(len(recipe_ids))
+            saved, _ = self.compute(
+                matrices, costs, recipe_ids, targets, options
+            )
+        else:
+            targets = self.positions(
+                recipe_ids, changed.values_list('id', flat=True)
+            )
+            saved, neighbours = self.compute(
+                matrices, costs, recipe_ids, targets, options
+            )
+            # Сходство симметрично: пересчитываются и рецепты, в соседях
+            # которых изменённые были раньше или могут оказаться теперь.
+            related = np.setdiff1d(
+                np.union1d(
+                    neighbours,
+                    self.positions(
+                        recipe_ids,
+                        SimilarRecipe.objects.filter(
+                            similar__in=changed.values('id')
+                        ).values_list('recipe', flat=True).distinct(),
+                    ),
+                ),
+                targets,
+            )
+            self.stage(f'Связанных рецептов: {len(related)}')
+            related_saved, _ = self.compute(
+                matrices, costs, recipe_ids, related, options
+            )
+            saved += related_saved
+            targets = np.union1d(targets, related)
+
+        print(
+            f'Готово: пересчитано {len(targets)} рецептов, '
+            f'сохранено {saved} связей.'
+        )
+
+    def compute(self, matrices, costs, recipe_ids, targets, options):
+        """Пересчитывает соседей targets; возвращает число сохранённых
+        связей и позиции найденных соседей.
+        """
+
+        saved = 0
+        neighbours = []
+        for number, items in enumerate(
+                chunks(targets, costs, options['max_pairs']), start=1
+        ):
+            rows, others, scores = top_neighbours(
+                matrices, items, len(recipe_ids), options['top_k']
+            )
+            self.save(recipe_ids, items, rows, others, scores)
+            saved += len(rows)
+            neighbours.append(np.unique(others))
+            self.stage(
+                f'Часть {number}: {len(items)} рецептов, '
+                f'{saved} связей всего'
+            )
+
+        return saved, np.unique(np.concatenate(
+            neighbours or [np.zeros(0, dtype=np.int64)]
+        ))
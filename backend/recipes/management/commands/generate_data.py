@@ -0,0 +1,266 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, call_command
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.cache import recipe_ingredients_cache, recipes_cache, users_cache
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientForRecipe,
+                            Recipe, ShoppingCart, ShoppingListItem, Tag)
+from recipes.search import update_recipe_search
+from users.models import Follow, User
+
+SAMPLE_IMAGE = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d4944415478da636460f85f0f0002870180eb47ba92'
+    '0000000049454e44ae426082'
+)
+SAMPLE_IMAGE_NAME = 'recipes/images/generated.png'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+
+
+class Command(BaseCommand):
+    """Кастомная команда генерации синтетических данных для нагрузочных
+    тестов: юзеры, рецепты, подписки, избранное и списки покупок.
+    """
+
+    help = 'Генерация синтетических данных для нагрузочных тестов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes-per-user', type=int, default=5)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument(
+            '--power',
+            type=float,
+            default=1.2,
+            help='Показатель степенного распределения популярности.',
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        if not Ingredient.objects.exists():
+            call_command('load_data')
+
+        with transaction.atomic():
+            tags = self.make_tags()
+            users = self.make_users(options['users'])
+            recipes = self.make_recipes(
+                users,
+                tags,
+                options['recipes_per_user'],
+                options['ingredients_per_recipe'],
+            )
+            self.make_follows(
+                users, options['follows_per_user'], options['power']
+            )
+            self.make_links(
+                FavoriteRecipe,
+                users,
+                recipes,
+                options['favorites_per_user'],
+                options['power'],
+            )
+            self.make_links(
+                ShoppingCart,
+                users,
+                recipes,
+                options['cart_per_user'],
+                options['power'],
+            )
+            self.refresh_denormalized()
+
+        duration = time.perf_counter() - started
+        print(f'Данные сгенерированы за {duration:.1f} с.')
+
+    def weights(self, size, power):
+        """Веса популярности по закону Ципфа."""
+
+        return [1 / (rank ** power) for rank in range(1, size + 1)]
+
+    def make_tags(self):
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug,
+                defaults={'name': name, 'color': color},
+            )
+
+        return list(Tag.objects.all())
+
+    def make_users(self, count):
+        print(f'Создание {count} юзеров ...')
+
+        prefix = f'load{int(time.time())}'
+        password = make_password('loadtest-password')
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{prefix}_{number}',
+                    email=f'{prefix}_{number}@example.org',
+                    first_name='Нагрузочный',
+                    last_name=f'Юзер {number}',
+                    password=password,
+                )
+                for number in range(count)
+            ),
+            batch_size=self.batch_size,
+        )
+
+        return list(
+            User.objects.filter(username__startswith=f'{prefix}_')
+            .values_list('id', flat=True)
+        )
+
+    def make_recipes(self, users, tags, per_user, ingredients_per_recipe):
+        print(f'Создание {len(users) * per_user} рецептов ...')
+
+        if not default_storage.exists(SAMPLE_IMAGE_NAME):
+            default_storage.save(SAMPLE_IMAGE_NAME, ContentFile(SAMPLE_IMAGE))
+
+        last_id = Recipe.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    name=f'Рецепт {author_id}-{number}',
+                    text='Сгенерированный рецепт для нагрузочных тестов.',
+                    author_id=author_id,
+                    image=SAMPLE_IMAGE_NAME,
+                    cooking_time=self.random.randint(5, 120),
+                )
+                for author_id in users
+                for number in range(per_user)
+            ),
+            batch_size=self.batch_size,
+        )
+        recipe_ids = list(
+            Recipe.objects.filter(id__gt=last_id).values_list('id', flat=True)
+        )
+
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        per_recipe = min(ingredients_per_recipe, len(ingredient_ids))
+        IngredientForRecipe.objects.bulk_create(
+            (
+                IngredientForRecipe(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.random.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.random.sample(
+                    ingredient_ids, per_recipe
+                )
+            ),
+            batch_size=self.batch_size,
+        )
+
+        through = Recipe.tags.through
+        through.objects.bulk_create(
+            (
+                through(recipe_id=recipe_id, tag_id=tag.id)
+                for recipe_id in recipe_ids
+                for tag in self.random.sample(
+                    tags, self.random.randint(1, len(tags))
+                )
+            ),
+            batch_size=self.batch_size,
+        )
+
+        print(f'Создано рецептов: {len(recipe_ids)}.')
+
+        return recipe_ids
+
+    def sample(self, population, weights, count, exclude=None):
+        chosen = set()
+        count = min(count, len(population) - (exclude is not None))
+        while len(chosen) < count:
+            for item in self.random.choices(population, weights, k=count):
+                if item != exclude:
+                    chosen.add(item)
+
+        return list(chosen)[:count]
+
+    def make_follows(self, users, per_user, power):
+        print('Создание подписок ...')
+
+        authors = users[:]
+        self.random.shuffle(authors)
+        weights = self.weights(len(authors), power)
+        Follow.objects.bulk_create(
+            (
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id in users
+                for author_id in self.sample(
+                    authors, weights, per_user, exclude=user_id
+                )
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def make_links(self, model, users, recipes, per_user, power):
+        print(f'Создание записей {model._meta.verbose_name_plural} ...')
+
+        recipes = recipes[:]
+        self.random.shuffle(recipes)
+        weights = self.weights(len(recipes), power)
+        model.objects.bulk_create(
+            (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in users
+                for recipe_id in self.sample(recipes, weights, per_user)
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def refresh_denormalized(self):
+        """bulk_create не шлёт сигналы: пересчитываем счётчики,
+        списки покупок, поисковый индекс и ленты подписок.
+        """
+
+        print('Пересчёт счётчиков и списков покупок ...')
+
+        Recipe.objects.update(favorites_count=Coalesce(Subquery(
+            FavoriteRecipe.objects.filter(
+                recipe=OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                total=Count('id')
+            ).values('total')[:1]
+        ), 0))
+        User.objects.update(recipes_count=Coalesce(Subquery(
+            Recipe.objects.filter(
+                author=OuterRef('pk')
+            ).order_by().values('author').annotate(
+                total=Count('id')
+            ).values('total')[:1]
+        ), 0))
+        User.objects.update(followers_count=Coalesce(Subquery(
+            Follow.objects.filter(
+                author=OuterRef('pk')
+            ).order_by().values('author').annotate(
+                total=Count('id')
+            ).values('total')[:1]
+        ), 0))
+        ShoppingListItem.objects.rebuild()
+        update_recipe_search()
+        recipe_ingredients_cache.invalidate()
+        recipes_cache.invalidate()
+        users_cache.invalidate()
+        call_command('backfill_feed')
@@ -1,30 +1,233 @@
-from csv import DictReader
+import csv
+import io
+import json
+import os
+import re
+import sys
+import time
+from itertools import islice
 
-from django.core.management import BaseCommand
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from recipes.cache import ingredients_cache
 from recipes.models import Ingredient
 
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class JsonArrayReader:
+    """Потоковое чтение элементов json-массива верхнего уровня:
+    в памяти только текущая часть файла, а не весь документ.
+    """
+
+    def __init__(self, file, chunk_size=64 * 1024):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.position = 0
+
+    def read_more(self):
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            return False
+
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+        return True
+
+    def next_char(self):
+        while True:
+            self.position = WHITESPACE.match(
+                self.buffer, self.position
+            ).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.read_more():
+                raise CommandError('Неожиданный конец json-файла.')
+
+    def expect(self, chars):
+        char = self.next_char()
+        if char not in chars:
+            raise CommandError(
+                'json-файл должен содержать массив ингредиентов.'
+            )
+        self.position += 1
+
+        return char
+
+    def decode(self):
+        while True:
+            try:
+                item, end = self.decoder.raw_decode(
+                    self.buffer, self.position
+                )
+            except json.JSONDecodeError as error:
+                # Элемент не поместился в буфер целиком.
+                if not self.read_more():
+                    raise CommandError(f'Некорректный json: {error}')
+                continue
+
+            # Число в конце буфера могло быть прочитано не полностью.
+            if end == len(self.buffer) and self.read_more():
+                continue
+
+            self.position = end
+
+            return item
+
+    def __iter__(self):
+        self.expect('[')
+        if self.next_char() == ']':
+            return
+
+        while True:
+            self.next_char()
+            yield self.decode()
+            if self.expect(',]') == ']':
+                return
+
 
 class Command(BaseCommand):
-    """Кастомная команда загрузки данных об ингредиентах из csv файла в БД."""
+    """Кастомная команда загрузки данных об ингредиентах в БД.
 
-    help = 'Загрузка данных ингредиентов из csv файла в БД.'
+    Читает csv или json потоково, вставляет пачками и пропускает уже
+    существующие ингредиенты, поэтому её можно запускать повторно.
+    """
+
+    help = 'Загрузка данных ингредиентов из csv/json файла в БД.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'ingredients.csv'),
+            help='Путь к файлу или "-" для чтения из stdin.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'json', 'jsonl'),
+            help='Формат данных; по умолчанию определяется по расширению.',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY на PostgreSQL.',
+        )
+
+    def get_format(self, path, data_format):
+        if data_format:
+            return data_format
+
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        if extension in ('json', 'jsonl'):
+            return extension
+
+        return 'csv'
+
+    def read_rows(self, file, data_format):
+        if data_format == 'csv':
+            rows = csv.reader(file)
+        elif data_format == 'jsonl':
+            rows = (
+                json.loads(line) for line in file if line.strip()
+            )
+        else:
+            rows = JsonArrayReader(file)
+
+        for row in rows:
+            if isinstance(row, dict):
+                row = (row.get('name'), row.get('measurement_unit'))
+            if len(row) < 2 or not row[0] or not row[1]:
+                continue
+
+            yield row[0].strip(), row[1].strip()
+
+    def batches(self, rows, batch_size):
+        rows = iter(rows)
+        batch = list(islice(rows, batch_size))
+        while batch:
+            yield batch
+            batch = list(islice(rows, batch_size))
+
+    def insert_batch(self, batch):
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in batch
+            ],
+            ignore_conflicts=True,
+        )
+
+    def copy_batch(self, cursor, batch):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        cursor.copy_expert(
+            'COPY ingredient_import (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)',
+            buffer,
+        )
+
+    def report(self, processed, started):
+        rate = processed / max(time.perf_counter() - started, 1e-9)
+        print(f'Обработано строк: {processed} ({rate:.0f} строк/с)')
 
     def handle(self, *args, **options):
-        if Ingredient.objects.exists():
-            print('Данные инредиентов уже загружены!')
+        path = options['path']
+        data_format = self.get_format(path, options['format'])
+        use_copy = connection.vendor == 'postgresql' and not options['no_copy']
 
-            return
+        try:
+            file = (
+                sys.stdin if path == '-'
+                else open(path, encoding='utf-8', newline='')
+            )
+        except OSError as error:
+            raise CommandError(f'Не удалось открыть {path}: {error}')
 
         print('Загрузка данных ингредиентов в БД ...')
 
-        bulk_data = []
-        for row in DictReader(
-                open('ingredients.csv', encoding='utf-8'),
-                fieldnames=('name', 'measurement_unit')):
-            bulk_data.append(Ingredient(
-                name=row['name'],
-                measurement_unit=row['measurement_unit'],
-            ))
+        before = Ingredient.objects.count()
+        started = time.perf_counter()
+        processed = 0
+
+        with file, transaction.atomic(), connection.cursor() as cursor:
+            table = Ingredient._meta.db_table
+            if use_copy:
+                cursor.execute(
+                    'CREATE TEMPORARY TABLE ingredient_import '
+                    f'(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP'
+                )
+                cursor.execute('ALTER TABLE ingredient_import DROP COLUMN id')
+
+            for batch in self.batches(
+                    self.read_rows(file, data_format), options['batch_size']
+            ):
+                if use_copy:
+                    self.copy_batch(cursor, batch)
+                else:
+                    self.insert_batch(batch)
+                processed += len(batch)
+                self.report(processed, started)
+
+            if use_copy:
+                cursor.execute(
+                    f'INSERT INTO {table} (name, measurement_unit) '
+                    'SELECT DISTINCT name, measurement_unit '
+                    'FROM ingredient_import '
+                    'ON CONFLICT (name, measurement_unit) DO NOTHING'
+                )
+
+        ingredients_cache.invalidate()
 
-        Ingredient.objects.bulk_create(bulk_data)
+        added = Ingredient.objects.count() - before
+        print(
+            f'Готово: обработано {processed}, добавлено {added}, '
+            f'пропущено {processed - added} за '
+            f'{time.perf_counter() - started:.2f} с.'
+        )
@@ -0,0 +1,41 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    """Кастомная команда пересчёта агрегированных списков покупок."""
+
+    help = 'Пересчёт (или проверка) агрегированных списков покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить списки покупок, ничего не изменяя.',
+        )
+
+    def handle(self, *args, **options):
+        stored = set(
+            ShoppingListItem.objects.values_list(
+                'user', 'ingredient', 'amount'
+            )
+        )
+        expected = set(ShoppingListItem.objects.compute_totals())
+        mismatches = stored ^ expected
+
+        print(f'Расхождений в списках покупок: {len(mismatches)}.')
+
+        if options['check']:
+            if mismatches:
+                raise SystemExit(1)
+
+            return
+
+        print('Пересчёт списков покупок ...')
+
+        with transaction.atomic():
+            items = ShoppingListItem.objects.rebuild()
+
+        print(f'Списки покупок пересчитаны: {len(items)} строк.')
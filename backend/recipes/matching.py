@@ -0,0 +1,265 @@
+import heapq
+import logging
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import close_old_connections, transaction
+
+from .cache import recipe_ingredients_cache
+from .models import IngredientForRecipe
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=1,
+    thread_name_prefix='recipe-index',
+)
+
+
+class InvertedIndex:
+    """Инвертированный индекс ингредиент -> отсортированный массив id
+    рецептов, в которых он используется.
+
+    Число ингредиентов рецепта хранится в массиве, индексированном id
+    рецепта; этого достаточно, чтобы посчитать недостающие ингредиенты.
+    Прямой индекс рецепт -> ингредиенты (массивы offsets/ingredients
+    плюс словарь рецептов, изменённых после построения) нужен, чтобы
+    удалять рецепт только из его списков.
+
+    id хранятся в массивах 'Q': ключи моделей — BigAutoField.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.sizes = array('H')
+        self.offsets = array('Q', [0])
+        self.ingredients = array('Q')
+        self.changed = {}
+
+    def build(self, pairs):
+        """Строит индекс по парам (ingredient_id, recipe_id)."""
+
+        postings = {}
+        sizes = array('H')
+        for ingredient_id, recipe_id in pairs:
+            postings.setdefault(ingredient_id, array('Q')).append(recipe_id)
+            if recipe_id >= len(sizes):
+                sizes.extend(bytes(recipe_id + 1 - len(sizes)))
+            sizes[recipe_id] += 1
+
+        offsets = array('Q', [0])
+        offsets.extend(accumulate(sizes))
+        ingredients = array('Q', bytes(8 * offsets[-1]))
+        positions = array('Q', offsets)
+        for ingredient_id, recipe_ids in postings.items():
+            recipe_ids[:] = array('Q', sorted(recipe_ids))
+            for recipe_id in recipe_ids:
+                ingredients[positions[recipe_id]] = ingredient_id
+                positions[recipe_id] += 1
+
+        self.postings = postings
+        self.sizes = sizes
+        self.offsets = offsets
+        self.ingredients = ingredients
+        self.changed = {}
+
+        return self
+
+    def ingredients_of(self, recipe_id):
+        """id ингредиентов рецепта."""
+
+        if recipe_id in self.changed:
+            return self.changed[recipe_id]
+        if recipe_id + 1 >= len(self.offsets):
+            return ()
+
+        return self.ingredients[
+            self.offsets[recipe_id]:self.offsets[recipe_id + 1]
+        ]
+
+    def remove(self, recipe_id):
+        for ingredient_id in self.ingredients_of(recipe_id):
+            recipe_ids = self.postings[ingredient_id]
+            position = bisect_left(recipe_ids, recipe_id)
+            if (
+                    position < len(recipe_ids)
+                    and recipe_ids[position] == recipe_id
+            ):
+                del recipe_ids[position]
+        if recipe_id < len(self.sizes):
+            self.sizes[recipe_id] = 0
+        self.changed[recipe_id] = ()
+
+    def add(self, recipe_id, ingredient_ids):
+        """Добавляет рецепт, заменяя его прежний набор ингредиентов."""
+
+        self.remove(recipe_id)
+
+        ingredient_ids = set(ingredient_ids)
+        for ingredient_id in ingredient_ids:
+            recipe_ids = self.postings.setdefault(ingredient_id, array('Q'))
+            recipe_ids.insert(bisect_left(recipe_ids, recipe_id), recipe_id)
+
+        if recipe_id >= len(self.sizes):
+            self.sizes.extend(bytes(recipe_id + 1 - len(self.sizes)))
+        self.sizes[recipe_id] = len(ingredient_ids)
+        self.changed[recipe_id] = tuple(ingredient_ids)
+
+    def match(self, ingredient_ids, max_missing=0, limit=100):
+        """Рецепты, для которых не хватает не более max_missing
+        ингредиентов: список (recipe_id, совпало, не хватает),
+        сначала с меньшим числом недостающих.
+        """
+
+        hits = Counter()
+        for ingredient_id in set(ingredient_ids):
+            hits.update(self.postings.get(ingredient_id, ()))
+
+        sizes = self.sizes
+        candidates = (
+            (recipe_id, matched, sizes[recipe_id] - matched)
+            for recipe_id, matched in hits.items()
+            if sizes[recipe_id] - matched <= max_missing
+        )
+
+        return heapq.nsmallest(
+            limit, candidates, key=lambda item: (item[2], -item[1], -item[0])
+        )
+
+    def memory_size(self):
+        """Размер массивов индекса в байтах."""
+
+        return sum(
+            values.itemsize * len(values)
+            for values in (
+                self.sizes, self.offsets, self.ingredients,
+                *self.postings.values(),
+            )
+        )
+
+
+class RecipeIngredientIndex:
+    """Индекс ингредиентов рецептов в памяти процесса.
+
+    Изменения рецептов этого процесса применяются сразу. Индексы
+    остальных процессов перестраиваются в фоне при смене версии не чаще
+    раза в RECIPE_INDEX_REFRESH секунд, запросы тем временем читают
+    прежний индекс. Если версия хранится в LocMemCache, изменений других
+    процессов не видно, и индекс перестраивается просто по времени.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._built_at = None
+        self._index = None
+        # Изменения рецептов за время фоновой перестройки: применяются
+        # к новому индексу, т.к. снимок БД для него мог их не застать.
+        self._changes = None
+
+    def build(self):
+        return InvertedIndex().build(
+            IngredientForRecipe.objects.order_by().values_list(
+                'ingredient', 'recipe'
+            ).iterator(chunk_size=10000)
+        )
+
+    def is_stale(self):
+        if time.monotonic() - self._built_at < settings.RECIPE_INDEX_REFRESH:
+            return False
+
+        return (
+            isinstance(recipe_ingredients_cache.backend, LocMemCache)
+            or self._version != recipe_ingredients_cache.version()
+        )
+
+    def _load(self):
+        if self._index is None:
+            # Первый запрос процесса: прежнего индекса нет.
+            with self._lock:
+                if self._index is None:
+                    self._version = recipe_ingredients_cache.version()
+                    self._index = self.build()
+                    self._built_at = time.monotonic()
+        elif self.is_stale():
+            self.schedule_rebuild()
+
+        return self._index
+
+    def schedule_rebuild(self):
+        with self._lock:
+            if self._changes is not None:
+                return
+
+            self._changes = {}
+
+        executor.submit(self.rebuild)
+
+    def rebuild(self):
+        """Строит новый индекс и подменяет им текущий."""
+
+        close_old_connections()
+        try:
+            version = recipe_ingredients_cache.version()
+            index = self.build()
+            with self._lock:
+                for recipe_id, ingredient_ids in self._changes.items():
+                    if ingredient_ids:
+                        index.add(recipe_id, ingredient_ids)
+                    else:
+                        index.remove(recipe_id)
+                self._index = index
+                self._version = version
+        except Exception:
+            logger.exception('Не удалось перестроить индекс ингредиентов')
+        finally:
+            with self._lock:
+                self._changes = None
+                self._built_at = time.monotonic()
+            close_old_connections()
+
+    def match(self, ingredient_ids, max_missing=0, limit=100):
+        return self._load().match(ingredient_ids, max_missing, limit)
+
+    def _apply(self, recipe_id, ingredient_ids):
+        up_to_date = self._version == recipe_ingredients_cache.version()
+        recipe_ingredients_cache.invalidate()
+
+        with self._lock:
+            if self._changes is not None:
+                self._changes[recipe_id] = ingredient_ids
+            if self._index is None:
+                return
+
+            if ingredient_ids:
+                self._index.add(recipe_id, ingredient_ids)
+            else:
+                self._index.remove(recipe_id)
+            if up_to_date:
+                self._version = recipe_ingredients_cache.version()
+
+    def refresh_recipe(self, recipe_id):
+        self._apply(recipe_id, list(
+            IngredientForRecipe.objects.filter(
+                recipe=recipe_id
+            ).values_list('ingredient', flat=True)
+        ))
+
+    def remove_recipe(self, recipe_id):
+        self._apply(recipe_id, ())
+
+
+recipe_index = RecipeIngredientIndex()
+
+
+def schedule_recipe_index(recipe_id):
+    """Обновляет индекс после фиксации транзакции."""
+
+    transaction.on_commit(lambda: recipe_index.refresh_recipe(recipe_id))
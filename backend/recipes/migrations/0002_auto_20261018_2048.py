@@ -0,0 +1,161 @@
+# Generated by Django 3.2.18 on 2026-10-18 20:48
+#
+# Догоняющая миграция: модели recipes менялись без миграций. На БД, где
+# схема уже приведена к моделям локальными миграциями, удалите их файлы
+# и записи в django_migrations, затем отметьте эту миграцию применённой:
+#   python manage.py migrate recipes 0002 --fake
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FavoriteRecipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'Избранный рецепт',
+                'verbose_name_plural': 'Избранные рецепты',
+                'ordering': ['user'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Ingredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='ингредиент')),
+                ('measurement_unit', models.CharField(max_length=200, verbose_name='единица измерения')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент',
+                'verbose_name_plural': 'Ингредиенты',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='IngredientForRecipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipes_for_ingredients', to='recipes.ingredient', verbose_name='id ингредиента')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент для рецепта',
+                'verbose_name_plural': 'Ингредиенты для рецептов',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Recipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, verbose_name='название рецепта')),
+                ('text', models.TextField(verbose_name='описание рецепта')),
+                ('image', models.ImageField(upload_to='recipes/images/', verbose_name='изображение')),
+                ('cooking_time', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('pub_date', models.DateTimeField(auto_now_add=True, verbose_name='время публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта')),
+                ('ingredients', models.ManyToManyField(through='recipes.IngredientForRecipe', to='recipes.Ingredient')),
+            ],
+            options={
+                'verbose_name': 'Рецепт',
+                'verbose_name_plural': 'Рецепты',
+                'ordering': ['-pub_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ShoppingCart',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_recipes', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopper', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Рецепт для списка покупок',
+                'verbose_name_plural': 'Рецепты для списка покупок',
+                'ordering': ['user'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True, verbose_name='название тэга')),
+                ('color', models.CharField(max_length=7, unique=True, validators=[django.core.validators.RegexValidator(message='Неправильный формат HEX кода!', regex='^[#]')], verbose_name='color in Hex')),
+                ('slug', models.SlugField(max_length=200, unique=True, verbose_name='slug')),
+            ],
+            options={
+                'verbose_name': 'Тэг',
+                'verbose_name_plural': 'Тэги',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RemoveField(
+            model_name='ingredientsforrecipes',
+            name='ingredient_id',
+        ),
+        migrations.RemoveField(
+            model_name='ingredientsforrecipes',
+            name='recipe_id',
+        ),
+        migrations.RemoveField(
+            model_name='recipes',
+            name='author',
+        ),
+        migrations.DeleteModel(
+            name='Ingredients',
+        ),
+        migrations.DeleteModel(
+            name='IngredientsForRecipes',
+        ),
+        migrations.DeleteModel(
+            name='Recipes',
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='tags',
+            field=models.ManyToManyField(related_name='tags', to='recipes.Tag', verbose_name='Тэги'),
+        ),
+        migrations.AddField(
+            model_name='ingredientforrecipe',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredients_for_recipe', to='recipes.recipe', verbose_name='id рецепта'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='uniq_name_and_measurement_unit'),
+        ),
+        migrations.AddField(
+            model_name='favoriterecipe',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='selected', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddField(
+            model_name='favoriterecipe',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chooser', to=settings.AUTH_USER_MODEL, verbose_name='Юзер'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='uniq_recipe_and_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientforrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='uniq_recipe_and_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='favoriterecipe',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='uniq_user_and_recipe'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.18 on 2026-10-18 20:55
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FavoriteRecipe = apps.get_model('recipes', 'FavoriteRecipe')
+    User = apps.get_model('users', 'User')
+
+    Recipe.objects.update(favorites_count=Coalesce(models.Subquery(
+        FavoriteRecipe.objects.filter(
+            recipe=models.OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            total=models.Count('id')
+        ).values('total')[:1]
+    ), 0))
+    User.objects.update(recipes_count=Coalesce(models.Subquery(
+        Recipe.objects.filter(
+            author=models.OuterRef('pk')
+        ).order_by().values('author').annotate(
+            total=models.Count('id')
+        ).values('total')[:1]
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_recipes_count'),
+        ('recipes', '0006_recipe_pub_date_id_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='favoriterecipe',
+            options={'ordering': ['user', 'recipe'], 'verbose_name': 'Избранный рецепт', 'verbose_name_plural': 'Избранные рецепты'},
+        ),
+        migrations.AlterModelOptions(
+            name='shoppingcart',
+            options={'ordering': ['user', 'recipe'], 'verbose_name': 'Рецепт для списка покупок', 'verbose_name_plural': 'Рецепты для списка покупок'},
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='в избранном'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipe_tags_tag_recipe_idx',
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        config = settings.RECIPE_SEARCH_CONFIG
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe '
+            'ADD COLUMN IF NOT EXISTS search_vector tsvector'
+        )
+        schema_editor.execute(
+            'UPDATE recipes_recipe SET search_vector = '
+            "setweight(to_tsvector(%s::regconfig, name), 'A') || "
+            'setweight(to_tsvector(%s::regconfig, COALESCE(('
+            "SELECT string_agg(i.name, ' ') "
+            'FROM recipes_ingredientforrecipe ir '
+            'JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+            "WHERE ir.recipe_id = recipes_recipe.id), '')), 'B') || "
+            "setweight(to_tsvector(%s::regconfig, text), 'C')",
+            [config] * 3,
+        )
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_idx '
+            'ON recipes_recipe USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_search '
+            'USING fts5(name, ingredients, text, '
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            'INSERT INTO recipes_recipe_search '
+            '(rowid, name, ingredients, text) '
+            'SELECT id, name, COALESCE(('
+            "SELECT group_concat(i.name, ' ') "
+            'FROM recipes_ingredientforrecipe ir '
+            'JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+            "WHERE ir.recipe_id = recipes_recipe.id), ''), text "
+            'FROM recipes_recipe'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_feedentry'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
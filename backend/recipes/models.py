@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import connections, models
+from django.db.models import Exists, OuterRef, Prefetch, Q, Value
+from django.db.models.expressions import RawSQL
 
-from users.models import User
+from users.models import Follow, User
 
 
 class Tag(models.Model):
@@ -65,6 +68,69 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Кверисет рецептов с предвычисленными данными для выдачи."""
+
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredients_for_recipe',
+                queryset=IngredientForRecipe.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+    def with_user_flags(self, user):
+        if user is None or user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=models.BooleanField()),
+                is_in_shopping_cart=Value(
+                    False,
+                    output_field=models.BooleanField()
+                ),
+                author_is_subscribed=Value(
+                    False,
+                    output_field=models.BooleanField()
+                ),
+            )
+
+        return self.annotate(
+            is_favorited=Exists(FavoriteRecipe.objects.filter(
+                user=user,
+                recipe=OuterRef('pk'),
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user,
+                recipe=OuterRef('pk'),
+            )),
+            author_is_subscribed=Exists(Follow.objects.filter(
+                user=user,
+                author=OuterRef('author'),
+            )),
+        )
+
+    def latest_for_authors(self, author_ids, limit):
+        """Последние limit рецептов каждого автора одним запросом."""
+
+        author_ids = list(author_ids)
+        if not author_ids:
+            return self.none()
+
+        placeholders = ', '.join(['%s'] * len(author_ids))
+        ranked = (
+            'SELECT id FROM ('
+            'SELECT id, ROW_NUMBER() OVER ('
+            'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+            f') AS author_rank FROM {self.model._meta.db_table} '
+            f'WHERE author_id IN ({placeholders})'
+            ') ranked WHERE author_rank <= %s'
+        )
+
+        return self.filter(pk__in=RawSQL(ranked, (*author_ids, limit)))
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
 
@@ -94,6 +160,12 @@ class Recipe(models.Model):
         verbose_name='изображение',
         upload_to='recipes/images/',
     )
+    image_variants = models.JSONField(
+        verbose_name='копии изображения',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     cooking_time = models.PositiveIntegerField(
         validators=[MinValueValidator(1)]
     )
@@ -101,15 +173,41 @@ class Recipe(models.Model):
         verbose_name='время публикации',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='время изменения',
+        auto_now=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='в избранном',
+        default=0,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return self.name
 
+    def ingredient_amounts(self):
+        return dict(
+            self.ingredients_for_recipe.values_list('ingredient', 'amount')
+        )
+
 
 class IngredientForRecipe(models.Model):
     """Модель рецепт-ингредиент-количество."""
@@ -169,7 +267,7 @@ class FavoriteRecipe(models.Model):
                 name='uniq_user_and_recipe'
             )
         ]
-        ordering = ['user']
+        ordering = ['user', 'recipe']
         verbose_name = 'Избранный рецепт'
         verbose_name_plural = 'Избранные рецепты'
 
@@ -200,9 +298,358 @@ class ShoppingCart(models.Model):
                 name='uniq_recipe_and_user'
             )
         ]
-        ordering = ['user']
+        ordering = ['user', 'recipe']
         verbose_name = 'Рецепт для списка покупок'
         verbose_name_plural = 'Рецепты для списка покупок'
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    """Кверисет агрегированного списка покупок."""
+
+    upsert_batch_size = 300
+
+    def apply(self, user_ids, amounts, sign=1):
+        """Прибавляет (sign=1) или вычитает (sign=-1) количества
+        ингредиентов {ingredient_id: amount} в списках покупок юзеров.
+
+        Все изменения вносятся одним INSERT ... ON CONFLICT DO UPDATE
+        на пачку строк; опустевшие позиции затем удаляются.
+        """
+
+        rows = [
+            (user_id, ingredient_id, sign * amount)
+            for user_id in user_ids
+            for ingredient_id, amount in amounts.items() if amount
+        ]
+        if not rows:
+            return
+
+        self._for_write = True
+        connection = connections[self.db]
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            for start in range(0, len(rows), self.upsert_batch_size):
+                batch = rows[start:start + self.upsert_batch_size]
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                    f'VALUES {", ".join(["(%s, %s, %s)"] * len(batch))} '
+                    'ON CONFLICT (user_id, ingredient_id) DO UPDATE '
+                    f'SET amount = {table}.amount + excluded.amount',
+                    [value for row in batch for value in row],
+                )
+
+        if any(delta < 0 for _, _, delta in rows):
+            self.filter(
+                user__in={user_id for user_id, _, _ in rows},
+                amount__lte=0,
+            ).delete()
+
+    def apply_recipes(self, user_ids, recipe_ids, sign=1):
+        """То же, что apply, для суммы ингредиентов нескольких рецептов."""
+
+        if not recipe_ids:
+            return
+
+        self.apply(user_ids, dict(
+            IngredientForRecipe.objects.filter(
+                recipe__in=recipe_ids
+            ).values_list('ingredient').annotate(
+                total=models.Sum('amount')
+            ).order_by()
+        ), sign)
+
+    def compute_totals(self, user_ids=None):
+        """Суммы ингредиентов по рецептам из списков покупок."""
+
+        totals = IngredientForRecipe.objects.filter(
+            recipe__shopping_recipes__isnull=False
+        )
+        if user_ids is not None:
+            totals = totals.filter(recipe__shopping_recipes__user__in=user_ids)
+
+        return totals.values_list(
+            'recipe__shopping_recipes__user', 'ingredient'
+        ).annotate(
+            total=models.Sum('amount')
+        ).order_by()
+
+    def rebuild(self, user_ids=None):
+        """Пересчитывает списки покупок с нуля."""
+
+        items = self.all()
+        if user_ids is not None:
+            items = items.filter(user__in=user_ids)
+
+        items.delete()
+
+        return self.bulk_create(
+            ShoppingListItem(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                amount=total,
+            )
+            for user_id, ingredient_id, total in self.compute_totals(user_ids)
+        )
+
+
+class ShoppingListItem(models.Model):
+    """Модель агрегированного списка покупок юзера."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_list_items',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(
+        verbose_name='количество',
+    )
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='uniq_shopping_list_user_and_ingredient'
+            )
+        ]
+        ordering = ['user']
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Списки покупок'
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} {self.amount}'
+
+
+class FeedQuerySet(models.QuerySet):
+    """Кверисет ленты рецептов от авторов, на которых подписан юзер.
+
+    Рецепты авторов с числом подписчиков до FEED_FANOUT_LIMIT
+    раскладываются по лентам подписчиков при публикации, рецепты
+    остальных авторов подмешиваются при чтении. Когда автор опускается
+    до порога, ленты его подписчиков заполняются заново (fill_followers):
+    рецепты, вышедшие выше порога, в них не раскладывались.
+    """
+
+    @staticmethod
+    def is_pushed(author_id):
+        """Рецепты автора раскладываются по лентам, а не читаются."""
+
+        return User.objects.filter(
+            pk=author_id, followers_count__lte=settings.FEED_FANOUT_LIMIT
+        ).exists()
+
+    def fan_out(self, recipe):
+        """Добавляет рецепт в ленты подписчиков автора."""
+
+        # Число подписчиков читается из БД: у recipe.author оно могло
+        # устареть (например, юзер из кэша токенов).
+        if not self.is_pushed(recipe.author_id):
+            return
+
+        followers = Follow.objects.filter(
+            author=recipe.author_id
+        ).values_list('user', flat=True)
+        self.bulk_create(
+            (
+                FeedEntry(user_id=user_id, recipe=recipe,
+                          pub_date=recipe.pub_date)
+                for user_id in followers.iterator()
+            ),
+            batch_size=settings.FEED_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        self.trim(author_id=recipe.author_id)
+
+    def fill(self, user_id, author_id, trim=True):
+        """Добавляет последние рецепты автора в ленту юзера."""
+
+        recipes = Recipe.objects.filter(
+            author=author_id
+        ).values_list('id', 'pub_date')[:settings.FEED_MAX_LENGTH]
+        self.bulk_create(
+            (
+                FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                          pub_date=pub_date)
+                for recipe_id, pub_date in recipes
+            ),
+            batch_size=settings.FEED_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        if trim:
+            self.trim(user_id=user_id)
+
+    def fill_followers(self, author_id):
+        """Добавляет последние рецепты автора в ленты всех его
+        подписчиков.
+        """
+
+        recipes = list(Recipe.objects.filter(
+            author=author_id
+        ).values_list('id', 'pub_date')[:settings.FEED_MAX_LENGTH])
+        followers = Follow.objects.filter(
+            author=author_id
+        ).values_list('user', flat=True)
+        self.bulk_create(
+            (
+                FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                          pub_date=pub_date)
+                for user_id in followers.iterator()
+                for recipe_id, pub_date in recipes
+            ),
+            batch_size=settings.FEED_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        self.trim(author_id=author_id)
+
+    def trim(self, user_id=None, author_id=None):
+        """Обрезает ленты до FEED_MAX_LENGTH последних записей:
+        ленту юзера, ленты подписчиков автора или все ленты.
+        """
+
+        table = self.model._meta.db_table
+        params = []
+        condition = ''
+        if user_id is not None:
+            condition = 'WHERE user_id = %s'
+            params.append(user_id)
+        elif author_id is not None:
+            condition = (
+                f'WHERE user_id IN (SELECT user_id FROM '
+                f'{Follow._meta.db_table} WHERE author_id = %s)'
+            )
+            params.append(author_id)
+
+        ranked = (
+            'SELECT id FROM ('
+            'SELECT id, ROW_NUMBER() OVER ('
+            'PARTITION BY user_id ORDER BY pub_date DESC, recipe_id DESC'
+            f') AS feed_rank FROM {table} {condition}'
+            ') ranked WHERE feed_rank > %s'
+        )
+        params.append(settings.FEED_MAX_LENGTH)
+
+        return self.filter(pk__in=RawSQL(ranked, params)).delete()
+
+    def recipe_ids_for(self, user, position, limit):
+        """id рецептов ленты юзера в порядке (-pub_date, -id),
+        начиная после позиции курсора (pub_date, id).
+        """
+
+        entries = self.filter(user=user)
+        recipes = Recipe.objects.filter(author__in=Follow.objects.filter(
+            user=user,
+            author__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values('author'))
+
+        if position is not None:
+            pub_date, pk = position
+            entries = entries.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, recipe__lt=pk)
+            )
+            recipes = recipes.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+            )
+
+        merged = set(entries.order_by(
+            '-pub_date', '-recipe'
+        ).values_list('pub_date', 'recipe')[:limit])
+        merged.update(recipes.order_by(
+            '-pub_date', '-id'
+        ).values_list('pub_date', 'id')[:limit])
+
+        return [pk for _, pk in sorted(merged, reverse=True)[:limit]]
+
+
+class FeedEntry(models.Model):
+    """Модель записи ленты подписок юзера."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Юзер',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='время публикации',
+    )
+
+    objects = FeedQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='uniq_feed_user_and_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'
+            )
+        ]
+        ordering = ['user', '-pub_date', '-recipe']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+    def __str__(self):
+        return f'{self.user} {self.recipe}'
+
+
+class SimilarRecipe(models.Model):
+    """Модель похожего рецепта, рассчитанного пакетной командой
+    build_similar_recipes.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(
+        verbose_name='сходство',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='uniq_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            )
+        ]
+        ordering = ['recipe', '-score']
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}'
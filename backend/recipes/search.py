@@ -0,0 +1,217 @@
+import re
+from bisect import bisect_left
+from threading import Lock
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import (BooleanField, Case, FloatField, IntegerField,
+                              Value, When)
+from django.db.models.expressions import RawSQL
+
+from .cache import ingredients_cache
+from .models import Ingredient, Recipe
+
+RECIPE_SEARCH_TABLE = 'recipes_recipe_search'
+# Подзапрос идёт от индекса по recipe_id, название берётся по ключу:
+# с JOIN планировщик без статистики (сразу после массовой загрузки)
+# перебирал все ингредиенты на каждый рецепт.
+RECIPE_INGREDIENT_NAMES = (
+    'SELECT {aggregate}((SELECT i.name FROM recipes_ingredient i '
+    "WHERE i.id = ir.ingredient_id), ' ') "
+    'FROM recipes_ingredientforrecipe ir '
+    'WHERE ir.recipe_id = recipes_recipe.id'
+)
+POSTGRES_UPDATE_VECTOR = (
+    'UPDATE recipes_recipe SET search_vector = '
+    "setweight(to_tsvector(%s::regconfig, name), 'A') || "
+    'setweight(to_tsvector(%s::regconfig, COALESCE(('
+    + RECIPE_INGREDIENT_NAMES.format(aggregate='string_agg')
+    + "), '')), 'B') || "
+    "setweight(to_tsvector(%s::regconfig, text), 'C')"
+)
+SQLITE_INSERT_DOCUMENT = (
+    f'INSERT INTO {RECIPE_SEARCH_TABLE} (rowid, name, ingredients, text) '
+    'SELECT id, name, COALESCE(('
+    + RECIPE_INGREDIENT_NAMES.format(aggregate='group_concat')
+    + "), ''), text FROM recipes_recipe"
+)
+
+
+class IngredientPrefixIndex:
+    """Отсортированный индекс названий ингредиентов в памяти процесса.
+
+    Используется вместо триграммного индекса на бэкендах без pg_trgm.
+    Перестраивается при смене версии справочника ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._version = None
+        self._names = None
+        self._ids = None
+
+    def _load(self):
+        version = ingredients_cache.version()
+
+        with self._lock:
+            if self._version != version:
+                entries = sorted(
+                    (name.lower(), pk)
+                    for pk, name in Ingredient.objects.values_list(
+                        'id', 'name'
+                    )
+                )
+                self._ids = [pk for _, pk in entries]
+                self._names = [name for name, _ in entries]
+                self._version = version
+
+            return self._names, self._ids
+
+    def search(self, query, limit):
+        """id ингредиентов: сначала совпадения по началу названия,
+        затем по подстроке.
+        """
+
+        names, ids = self._load()
+        query = query.lower()
+        result = []
+
+        position = bisect_left(names, query)
+        while (
+                position < len(names)
+                and len(result) < limit
+                and names[position].startswith(query)
+        ):
+            result.append(ids[position])
+            position += 1
+
+        for name, pk in zip(names, ids):
+            if len(result) >= limit:
+                break
+            if query in name and not name.startswith(query):
+                result.append(pk)
+
+        return result
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+def search_ingredients(queryset, query, limit):
+    """Ранжированный поиск ингредиентов для автодополнения: кверисет
+    на PostgreSQL, список ингредиентов на остальных бэкендах.
+    """
+
+    if connection.vendor == 'postgresql':
+        return queryset.filter(
+            name__icontains=query
+        ).annotate(
+            prefix_rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('prefix_rank', 'name')[:limit]
+
+    # Порядок индекса восстанавливается в Python: CASE на каждый id
+    # в ORDER BY компилируется дольше, чем выполняется сам запрос.
+    ids = ingredient_index.search(query, limit)
+    ingredients = queryset.in_bulk(ids)
+
+    return [ingredients[pk] for pk in ids if pk in ingredients]
+
+
+def update_recipe_search(recipe_ids=None):
+    """Пересчитывает поисковый индекс рецептов (всех, если id не заданы).
+
+    На PostgreSQL это хранимый tsvector с GIN-индексом, на SQLite —
+    таблица FTS5; на остальных бэкендах индекса нет.
+    """
+
+    if recipe_ids is not None:
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            config = settings.RECIPE_SEARCH_CONFIG
+            if recipe_ids is None:
+                cursor.execute(POSTGRES_UPDATE_VECTOR, [config] * 3)
+            else:
+                cursor.execute(
+                    POSTGRES_UPDATE_VECTOR + ' WHERE id = ANY(%s)',
+                    [config] * 3 + [recipe_ids],
+                )
+        elif connection.vendor == 'sqlite':
+            if recipe_ids is None:
+                cursor.execute(f'DELETE FROM {RECIPE_SEARCH_TABLE}')
+                cursor.execute(SQLITE_INSERT_DOCUMENT)
+            else:
+                placeholders = ', '.join(['%s'] * len(recipe_ids))
+                cursor.execute(
+                    f'DELETE FROM {RECIPE_SEARCH_TABLE} '
+                    f'WHERE rowid IN ({placeholders})',
+                    recipe_ids,
+                )
+                cursor.execute(
+                    SQLITE_INSERT_DOCUMENT + f' WHERE id IN ({placeholders})',
+                    recipe_ids,
+                )
+
+
+def delete_recipe_search(recipe_id):
+    """Удаляет рецепт из таблицы FTS5 (tsvector удаляется вместе
+    со строкой рецепта).
+    """
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {RECIPE_SEARCH_TABLE} WHERE rowid = %s',
+                [recipe_id],
+            )
+
+
+def search_recipes(queryset, query):
+    """Полнотекстовый поиск рецептов по названию, ингредиентам и
+    описанию с сортировкой по релевантности.
+    """
+
+    if connection.vendor == 'postgresql':
+        tsquery = 'websearch_to_tsquery(%s::regconfig, %s)'
+        params = (settings.RECIPE_SEARCH_CONFIG, query)
+        queryset = queryset.filter(RawSQL(
+            f'recipes_recipe.search_vector @@ {tsquery}',
+            params,
+            output_field=BooleanField(),
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank_cd(recipes_recipe.search_vector, {tsquery})',
+            params,
+            output_field=FloatField(),
+        ))
+    elif connection.vendor == 'sqlite':
+        words = re.findall(r'\w+', query)
+        if not words:
+            return queryset.none()
+
+        match = ' '.join(f'"{word}"*' for word in words)
+        # Таблица FTS5 присоединяется один раз: bm25() считается
+        # в том же MATCH, что и отбор, а не подзапросом на каждую строку.
+        queryset = queryset.extra(
+            select={
+                'search_rank': f'-bm25({RECIPE_SEARCH_TABLE}, 10.0, 5.0, 1.0)'
+            },
+            tables=[RECIPE_SEARCH_TABLE],
+            where=[
+                f'{RECIPE_SEARCH_TABLE}.rowid = recipes_recipe.id',
+                f'{RECIPE_SEARCH_TABLE} MATCH %s',
+            ],
+            params=[match],
+        )
+    else:
+        queryset = queryset.filter(
+            name__icontains=query
+        ).annotate(search_rank=Value(1.0, output_field=FloatField()))
+
+    return queryset.order_by('-search_rank', *Recipe._meta.ordering)
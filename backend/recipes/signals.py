@@ -0,0 +1,278 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from users.models import Follow, User
+
+from .cache import (ingredients_cache, recipes_cache, tags_cache,
+                    user_flags_cache, users_cache)
+from .matching import recipe_index
+from .models import (FavoriteRecipe, FeedEntry, Ingredient,
+                     IngredientForRecipe, Recipe, ShoppingCart,
+                     ShoppingListItem, Tag)
+from .search import delete_recipe_search
+from .toggles import relations_changed
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+def increase_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            favorites_count=F('favorites_count') + 1
+        )
+
+
+@receiver(post_delete, sender=FavoriteRecipe)
+def decrease_favorites_count(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id, favorites_count__gt=0).update(
+        favorites_count=F('favorites_count') - 1
+    )
+
+
+@receiver(relations_changed, sender=FavoriteRecipe)
+def favorites_changed(sender, target_ids, created, **kwargs):
+    if created:
+        Recipe.objects.filter(pk__in=target_ids).update(
+            favorites_count=F('favorites_count') + 1
+        )
+    else:
+        Recipe.objects.filter(
+            pk__in=target_ids, favorites_count__gt=0
+        ).update(favorites_count=F('favorites_count') - 1)
+
+
+@receiver(post_save, sender=Recipe)
+def increase_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_recipes_count(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id, recipes_count__gt=0).update(
+        recipes_count=F('recipes_count') - 1
+    )
+
+
+def authors_at_fanout_limit(author_ids):
+    """Авторы, которые после отписки опустились до FEED_FANOUT_LIMIT:
+    их рецепты снова раскладываются по лентам подписчиков.
+    """
+
+    return User.objects.filter(
+        pk__in=author_ids, followers_count=settings.FEED_FANOUT_LIMIT
+    ).values_list('pk', flat=True)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(pk=instance.author_id).update(
+            followers_count=F('followers_count') + 1
+        )
+        if FeedEntry.objects.is_pushed(instance.author_id):
+            FeedEntry.objects.fill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    User.objects.filter(pk=instance.author_id, followers_count__gt=0).update(
+        followers_count=F('followers_count') - 1
+    )
+    FeedEntry.objects.filter(
+        user=instance.user_id,
+        recipe__author=instance.author_id,
+    ).delete()
+    for author_id in authors_at_fanout_limit([instance.author_id]):
+        FeedEntry.objects.fill_followers(author_id)
+
+
+@receiver(relations_changed, sender=Follow)
+def follows_changed(sender, user_id, target_ids, created, **kwargs):
+    if created:
+        User.objects.filter(pk__in=target_ids).update(
+            followers_count=F('followers_count') + 1
+        )
+        for author_id in User.objects.filter(
+            pk__in=target_ids,
+            followers_count__lte=settings.FEED_FANOUT_LIMIT,
+        ).values_list('pk', flat=True):
+            FeedEntry.objects.fill(user_id, author_id)
+    else:
+        User.objects.filter(
+            pk__in=target_ids, followers_count__gt=0
+        ).update(followers_count=F('followers_count') - 1)
+        FeedEntry.objects.filter(
+            user=user_id,
+            recipe__author__in=target_ids,
+        ).delete()
+        for author_id in authors_at_fanout_limit(target_ids):
+            FeedEntry.objects.fill_followers(author_id)
+
+
+# Агрегат ShoppingListItem ведётся по изменениям корзин и ингредиентов
+# рецептов, откуда бы они ни шли: API, админка, ORM или каскадное
+# удаление. При удалении рецепта его строки IngredientForRecipe и
+# ShoppingCart удаляются в любом порядке, но вычитаются ровно один раз:
+# каждый обработчик читает из БД то, что ещё осталось.
+def cart_user_ids(recipe_id):
+    return list(
+        ShoppingCart.objects.filter(recipe=recipe_id).values_list(
+            'user', flat=True
+        )
+    )
+
+
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=IngredientForRecipe)
+def remember_previous_row(sender, instance, raw, **kwargs):
+    instance._previous = None
+    if not raw and instance.pk is not None:
+        instance._previous = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        ShoppingListItem.objects.apply(
+            [previous.user_id],
+            Recipe(pk=previous.recipe_id).ingredient_amounts(),
+            sign=-1,
+        )
+    ShoppingListItem.objects.apply(
+        [instance.user_id], Recipe(pk=instance.recipe_id).ingredient_amounts()
+    )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def shopping_cart_deleted(sender, instance, **kwargs):
+    ShoppingListItem.objects.apply(
+        [instance.user_id],
+        Recipe(pk=instance.recipe_id).ingredient_amounts(),
+        sign=-1,
+    )
+
+
+@receiver(relations_changed, sender=ShoppingCart)
+def shopping_carts_changed(sender, user_id, target_ids, created, **kwargs):
+    ShoppingListItem.objects.apply_recipes(
+        [user_id], target_ids, 1 if created else -1
+    )
+
+
+@receiver(post_save, sender=IngredientForRecipe)
+def recipe_ingredient_saved(sender, instance, raw, **kwargs):
+    if raw:
+        return
+
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        ShoppingListItem.objects.apply(
+            cart_user_ids(previous.recipe_id),
+            {previous.ingredient_id: previous.amount},
+            sign=-1,
+        )
+    ShoppingListItem.objects.apply(
+        cart_user_ids(instance.recipe_id),
+        {instance.ingredient_id: instance.amount},
+    )
+
+
+@receiver(post_delete, sender=IngredientForRecipe)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    ShoppingListItem.objects.apply(
+        cart_user_ids(instance.recipe_id),
+        {instance.ingredient_id: instance.amount},
+        sign=-1,
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    recipe_id = instance.pk
+    delete_recipe_search(recipe_id)
+    transaction.on_commit(lambda: recipe_index.remove_recipe(recipe_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientForRecipe)
+@receiver(post_delete, sender=IngredientForRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipes_changed(sender, **kwargs):
+    transaction.on_commit(recipes_cache.invalidate)
+
+
+def touch_recipes(recipe_ids):
+    """Сдвигает updated_at рецептов: по нему строятся ETag рецепта
+    и ключи кэша его JSON.
+    """
+
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=IngredientForRecipe)
+@receiver(post_delete, sender=IngredientForRecipe)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    touch_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch_recipes([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        touch_recipes(pk_set)
+    elif action == 'pre_clear':
+        # После очистки связей рецепты тэга уже не найти.
+        touch_recipes(list(
+            Recipe.objects.filter(tags=instance).values_list('pk', flat=True)
+        ))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tags_changed(sender, **kwargs):
+    transaction.on_commit(tags_cache.invalidate)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    # По версии ingredients_cache перестраивается и индекс автодополнения.
+    transaction.on_commit(ingredients_cache.invalidate)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def users_changed(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+
+    transaction.on_commit(users_cache.invalidate)
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def user_flags_changed(sender, instance, **kwargs):
+    transaction.on_commit(user_flags_cache(instance.user_id).invalidate)
+
+
+@receiver(relations_changed)
+def user_flags_changed_many(sender, user_id, **kwargs):
+    transaction.on_commit(user_flags_cache(user_id).invalidate)
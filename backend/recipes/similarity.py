@@ -0,0 +1,127 @@
+import numpy as np
+
+
+def expand_ranges(starts, lengths):
+    """Склеивает диапазоны [start, start + length) в один массив."""
+
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+
+    return offsets + np.arange(total, dtype=np.int64)
+
+
+class SparseCosine:
+    """Косинусное сходство строк разреженной матрицы объект x признак.
+
+    Матрица хранится дважды в CSR-виде (по объектам и по признакам),
+    строки нормированы; сходство считается через общие признаки.
+    """
+
+    def __init__(self, items, features, weights, n_items):
+        norms = np.sqrt(np.bincount(items, weights ** 2, minlength=n_items))
+        weights = weights / norms[items]
+        n_features = int(features.max()) + 1 if len(features) else 0
+
+        order = np.lexsort((features, items))
+        self.item_ptr = self.pointers(items[order], n_items)
+        self.item_features = features[order]
+        self.item_weights = weights[order]
+
+        order = np.lexsort((items, features))
+        self.feature_ptr = self.pointers(features[order], n_features)
+        self.feature_items = items[order]
+        self.feature_weights = weights[order]
+
+    @staticmethod
+    def pointers(rows, n_rows):
+        ptr = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=ptr[1:])
+
+        return ptr
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in vars(self).values())
+
+    def costs(self):
+        """Число промежуточных пар, которое даёт каждая строка."""
+
+        posting = np.diff(self.feature_ptr)[self.item_features]
+        rows = np.repeat(
+            np.arange(len(self.item_ptr) - 1), np.diff(self.item_ptr)
+        )
+
+        return np.bincount(
+            rows, posting, minlength=len(self.item_ptr) - 1
+        ).astype(np.int64)
+
+    def pairs(self, items):
+        """Пары (объект, другой объект, вклад в сходство) для строк items."""
+
+        starts = self.item_ptr[items]
+        lengths = self.item_ptr[items + 1] - starts
+        entries = expand_ranges(starts, lengths)
+        rows = np.repeat(items, lengths)
+        features = self.item_features[entries]
+        weights = self.item_weights[entries]
+
+        starts = self.feature_ptr[features]
+        lengths = self.feature_ptr[features + 1] - starts
+        postings = expand_ranges(starts, lengths)
+
+        return (
+            np.repeat(rows, lengths),
+            self.feature_items[postings],
+            np.repeat(weights, lengths) * self.feature_weights[postings],
+        )
+
+
+def chunks(items, costs, max_pairs):
+    """Делит items на части с суммарной стоимостью не больше max_pairs."""
+
+    cumulative = np.cumsum(costs[items])
+    start = 0
+    while start < len(items):
+        offset = cumulative[start - 1] if start else 0
+        end = int(np.searchsorted(cumulative, offset + max_pairs, 'right'))
+        end = max(end, start + 1)
+        yield items[start:end]
+        start = end
+
+
+def top_neighbours(matrices, items, n_items, top_k):
+    """Top-K соседей для items по взвешенной сумме сходств.
+
+    matrices — пары (SparseCosine, вес). Возвращает массивы
+    (объект, сосед, сходство), отсортированные по объекту и сходству.
+    """
+
+    rows, others, scores = [], [], []
+    for matrix, weight in matrices:
+        matrix_rows, matrix_others, matrix_scores = matrix.pairs(items)
+        rows.append(matrix_rows)
+        others.append(matrix_others)
+        scores.append(matrix_scores * weight)
+
+    rows = np.concatenate(rows)
+    others = np.concatenate(others)
+    scores = np.concatenate(scores)
+    distinct = rows != others
+    keys = rows[distinct] * n_items + others[distinct]
+
+    keys, inverse = np.unique(keys, return_inverse=True)
+    scores = np.bincount(inverse, scores[distinct], minlength=len(keys))
+    rows, others = np.divmod(keys, n_items)
+
+    order = np.lexsort((-scores, rows))
+    rows, others, scores = rows[order], others[order], scores[order]
+    group_starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    ranks = np.arange(len(rows)) - np.repeat(
+        group_starts, np.diff(np.r_[group_starts, len(rows)])
+    )
+    keep = ranks < top_k
+
+    return rows[keep], others[keep], scores[keep]
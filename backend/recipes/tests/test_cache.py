@@ -0,0 +1,62 @@
+from django.core.cache import caches
+from django.test import TestCase
+
+from recipes.cache import ingredients_cache, tags_cache
+from recipes.models import Ingredient, Tag
+from recipes.search import ingredient_index
+
+
+class ReferenceCacheInvalidationTest(TestCase):
+    """Версии справочников меняются после коммита транзакции,
+    а не при сохранении внутри неё.
+    """
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def assert_invalidated_on_commit(self, cache, change):
+        version = cache.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+            self.assertEqual(cache.version(), version)
+
+        self.assertNotEqual(cache.version(), version)
+
+    def test_tag_saved(self):
+        self.assert_invalidated_on_commit(
+            tags_cache,
+            lambda: Tag.objects.create(
+                name='Завтрак', color='#E26C2D', slug='breakfast'
+            ),
+        )
+
+    def test_tag_deleted(self):
+        tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+
+        self.assert_invalidated_on_commit(tags_cache, tag.delete)
+
+    def test_ingredient_saved(self):
+        ingredient_index.search('сол', 20)
+
+        self.assert_invalidated_on_commit(
+            ingredients_cache,
+            lambda: Ingredient.objects.create(
+                name='соль', measurement_unit='г'
+            ),
+        )
+        self.assertEqual(
+            ingredient_index.search('сол', 20),
+            [Ingredient.objects.get(name='соль').pk],
+        )
+
+    def test_ingredient_deleted(self):
+        ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+
+        self.assert_invalidated_on_commit(
+            ingredients_cache, ingredient.delete
+        )
@@ -0,0 +1,70 @@
+from django.test import TestCase, override_settings
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+
+@override_settings(FEED_FANOUT_LIMIT=1)
+class FeedFanOutTest(TestCase):
+    """Рецепты не пропадают из лент, когда автор пересекает
+    FEED_FANOUT_LIMIT.
+    """
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com'
+        )
+        self.readers = [
+            User.objects.create_user(
+                username=f'reader{index}', email=f'reader{index}@example.com'
+            )
+            for index in range(2)
+        ]
+
+    def follow(self, reader):
+        return Follow.objects.create(user=reader, author=self.author)
+
+    def publish(self, author):
+        recipe = Recipe.objects.create(
+            author=author,
+            name='рецепт',
+            text='описание',
+            image='recipes/images/recipe.png',
+            cooking_time=10,
+        )
+        FeedEntry.objects.fan_out(recipe)
+
+        return recipe
+
+    def feed(self, reader):
+        return FeedEntry.objects.recipe_ids_for(reader, None, 10)
+
+    def test_author_drops_under_limit(self):
+        for reader in self.readers:
+            self.follow(reader)
+        recipe = self.publish(User.objects.get(pk=self.author.pk))
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.feed(self.readers[1]), [recipe.pk])
+
+        Follow.objects.get(user=self.readers[0]).delete()
+
+        self.assertEqual(self.feed(self.readers[1]), [recipe.pk])
+
+    def test_stale_followers_count(self):
+        self.follow(self.readers[0])
+        author = User.objects.get(pk=self.author.pk)
+        author.followers_count = 5
+
+        recipe = self.publish(author)
+
+        self.assertEqual(self.feed(self.readers[0]), [recipe.pk])
+
+    def test_big_author_not_filled(self):
+        self.publish(self.author)
+        self.follow(self.readers[0])
+
+        self.follow(self.readers[1])
+
+        self.assertFalse(FeedEntry.objects.filter(
+            user=self.readers[1]
+        ).exists())
@@ -0,0 +1,141 @@
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from PIL import Image
+
+from recipes import images
+from recipes.admin import RecipeAdmin
+from recipes.models import Recipe
+from users.models import User
+
+
+def make_image(name, color):
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), color).save(buffer, format='PNG')
+
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+class ImageVariantsTest(TransactionTestCase):
+    """Копии изображения создаются заново при его смене в админке
+    и командой backfill_image_variants, файлы прежних копий удаляются.
+    """
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, IMAGE_VARIANTS_SYNC=True
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.recipe = Recipe.objects.create(
+            author=User.objects.create_user(
+                username='author', email='author@example.com'
+            ),
+            name='рецепт',
+            text='описание',
+            image=make_image('recipes/images/first.png', 'red'),
+            cooking_time=10,
+        )
+        images.make_image_variants(self.recipe.pk)
+        self.recipe.refresh_from_db()
+        self.old_variants = list(self.recipe.image_variants.values())
+
+    def save_in_admin(self, recipe, changed_data):
+        form = mock.Mock(changed_data=changed_data)
+        with transaction.atomic():
+            RecipeAdmin(Recipe, site).save_model(None, recipe, form, True)
+            self.assertTrue(all(
+                default_storage.exists(name) for name in self.old_variants
+            ))
+
+        recipe.refresh_from_db()
+
+        return recipe
+
+    def test_image_replaced(self):
+        self.recipe.image = make_image('recipes/images/second.png', 'blue')
+
+        recipe = self.save_in_admin(self.recipe, ['image'])
+
+        self.assertEqual(len(recipe.image_variants), len(images.VARIANTS))
+        for name in recipe.image_variants.values():
+            self.assertTrue(name.startswith('recipes/images/second_'))
+            self.assertTrue(default_storage.exists(name))
+        for name in self.old_variants:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_image_unchanged(self):
+        self.recipe.name = 'новое название'
+
+        recipe = self.save_in_admin(self.recipe, ['name'])
+
+        self.assertEqual(
+            list(recipe.image_variants.values()), self.old_variants
+        )
+        for name in self.old_variants:
+            self.assertTrue(default_storage.exists(name))
+
+    def test_stale_variants_deleted(self):
+        render_variant = images.render_variant
+
+        def replace_image(*args):
+            Recipe.objects.filter(pk=self.recipe.pk).update(
+                image='recipes/images/other.png'
+            )
+
+            return render_variant(*args)
+
+        with mock.patch.object(images, 'render_variant', replace_image):
+            images.make_image_variants(self.recipe.pk)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            list(self.recipe.image_variants.values()), self.old_variants
+        )
+        _, files = default_storage.listdir('recipes/images')
+        self.assertEqual(
+            sorted(files),
+            sorted(['first.png', *(
+                name.rsplit('/', 1)[1] for name in self.old_variants
+            )]),
+        )
+
+    def backfill(self, **options):
+        with redirect_stdout(StringIO()):
+            call_command('backfill_image_variants', **options)
+        self.recipe.refresh_from_db()
+
+        return self.recipe.image_variants
+
+    def test_backfill_missing(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(image_variants={})
+
+        variants = self.backfill()
+
+        self.assertEqual(set(variants), set(images.VARIANTS))
+        for name in variants.values():
+            self.assertTrue(default_storage.exists(name))
+
+    def test_backfill_missing_files(self):
+        default_storage.delete(self.old_variants[0])
+
+        self.assertEqual(list(self.backfill().values()), self.old_variants)
+
+        variants = self.backfill(check_files=True)
+
+        for name in variants.values():
+            self.assertTrue(default_storage.exists(name))
+        for name in set(self.old_variants) - set(variants.values()):
+            self.assertFalse(default_storage.exists(name))
@@ -0,0 +1,36 @@
+import json
+from io import StringIO
+
+from django.core.management import CommandError
+from django.test import SimpleTestCase
+
+from recipes.management.commands.load_data import JsonArrayReader
+
+ROWS = [
+    {'name': 'соль', 'measurement_unit': 'г'},
+    ['сахар', 'г'],
+    {'name': 'мука ' * 50, 'measurement_unit': 'кг'},
+    12345,
+]
+
+
+class JsonArrayReaderTest(SimpleTestCase):
+    """json читается по элементам при любых границах частей файла."""
+
+    def test_chunk_boundaries(self):
+        text = json.dumps(ROWS, ensure_ascii=False, indent=2)
+
+        for chunk_size in (1, 2, 3, 7, 1024):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(
+                    list(JsonArrayReader(StringIO(text), chunk_size)), ROWS
+                )
+
+    def test_empty(self):
+        self.assertEqual(list(JsonArrayReader(StringIO(' [ ] '), 1)), [])
+
+    def test_invalid(self):
+        for text in ('', '{"name": "соль"}', '[1, 2', '[1 2]', '[{"a": }]'):
+            with self.subTest(text=text):
+                with self.assertRaises(CommandError):
+                    list(JsonArrayReader(StringIO(text), 2))
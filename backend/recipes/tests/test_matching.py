@@ -0,0 +1,211 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from recipes import matching
+from recipes.matching import InvertedIndex, RecipeIngredientIndex
+from recipes.models import Ingredient, IngredientForRecipe, Recipe
+from users.models import User
+
+# recipe_id -> ингредиенты
+RECIPES = {
+    1: {10, 11},
+    2: {10, 11, 12},
+    3: {10, 12, 13, 14},
+    5: {11},
+}
+
+
+def build_index():
+    return InvertedIndex().build(
+        (ingredient_id, recipe_id)
+        for recipe_id, ingredient_ids in RECIPES.items()
+        for ingredient_id in ingredient_ids
+    )
+
+
+class InvertedIndexTest(SimpleTestCase):
+
+    def assert_postings(self, index, expected):
+        self.assertEqual(
+            {
+                ingredient_id: list(recipe_ids)
+                for ingredient_id, recipe_ids in index.postings.items()
+                if recipe_ids
+            },
+            expected,
+        )
+
+    def test_build(self):
+        index = build_index()
+
+        self.assert_postings(index, {
+            10: [1, 2, 3],
+            11: [1, 2, 5],
+            12: [2, 3],
+            13: [3],
+            14: [3],
+        })
+        self.assertEqual(list(index.sizes), [0, 2, 3, 4, 0, 1])
+
+    def test_build_sorts_unordered_pairs(self):
+        index = InvertedIndex().build([(10, 3), (10, 1), (10, 2)])
+
+        self.assertEqual(list(index.postings[10]), [1, 2, 3])
+
+    def test_add_new_recipe(self):
+        index = build_index()
+        index.add(8, [10, 15, 15])
+
+        self.assertEqual(list(index.postings[10]), [1, 2, 3, 8])
+        self.assertEqual(list(index.postings[15]), [8])
+        self.assertEqual(index.sizes[8], 2)
+
+    def test_add_replaces_existing_recipe(self):
+        index = build_index()
+        index.add(2, [11, 13])
+
+        self.assert_postings(index, {
+            10: [1, 3],
+            11: [1, 2, 5],
+            12: [3],
+            13: [2, 3],
+            14: [3],
+        })
+        self.assertEqual(index.sizes[2], 2)
+
+    def test_remove(self):
+        index = build_index()
+        index.remove(3)
+
+        self.assert_postings(index, {
+            10: [1, 2],
+            11: [1, 2, 5],
+            12: [2],
+        })
+        self.assertEqual(index.sizes[3], 0)
+        self.assertEqual(index.match([10, 12, 13, 14], max_missing=4), [
+            (2, 2, 1), (1, 1, 1),
+        ])
+
+    def test_ingredients_of(self):
+        index = build_index()
+        index.add(2, [11, 13])
+        index.remove(5)
+
+        for recipe_id, ingredient_ids in (
+                (1, {10, 11}), (2, {11, 13}), (3, {10, 12, 13, 14}),
+                (4, set()), (5, set()), (100, set()),
+        ):
+            with self.subTest(recipe_id=recipe_id):
+                self.assertEqual(
+                    set(index.ingredients_of(recipe_id)), ingredient_ids
+                )
+
+    def test_remove_unknown_recipe(self):
+        index = build_index()
+        index.remove(4)
+        index.remove(100)
+
+        self.assertEqual(list(index.sizes), [0, 2, 3, 4, 0, 1])
+
+    def test_match_without_missing(self):
+        index = build_index()
+
+        self.assertEqual(index.match([10, 11]), [(1, 2, 0), (5, 1, 0)])
+        self.assertEqual(index.match([20]), [])
+
+    def test_match_with_missing(self):
+        index = build_index()
+
+        self.assertEqual(index.match([10, 11], max_missing=1), [
+            (1, 2, 0), (5, 1, 0), (2, 2, 1),
+        ])
+        self.assertEqual(index.match([10, 11], max_missing=3), [
+            (1, 2, 0), (5, 1, 0), (2, 2, 1), (3, 1, 3),
+        ])
+
+    def test_match_ranking(self):
+        index = build_index()
+        index.add(7, [10, 11])
+
+        # Меньше недостающих, затем больше совпавших, затем новее.
+        self.assertEqual(index.match([10, 11, 12], max_missing=2), [
+            (2, 3, 0), (7, 2, 0), (1, 2, 0), (5, 1, 0), (3, 2, 2),
+        ])
+
+    def test_match_ignores_duplicate_ingredients(self):
+        index = build_index()
+
+        self.assertEqual(index.match([10, 10, 11, 11]), index.match([10, 11]))
+
+    def test_match_limit(self):
+        index = build_index()
+
+        self.assertEqual(
+            index.match([10, 11, 12], max_missing=2, limit=2),
+            [(2, 3, 0), (1, 2, 0)],
+        )
+        self.assertEqual(index.match([10, 11], limit=0), [])
+
+
+@override_settings(RECIPE_INDEX_REFRESH=0)
+class RecipeIngredientIndexTest(TransactionTestCase):
+    """Устаревший индекс перестраивается в фоне, не теряя изменений,
+    сделанных во время перестройки.
+    """
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            matching.executor, 'submit', lambda function: function()
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com'
+        )
+        self.salt = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        self.first = self.create_recipe()
+        self.index = RecipeIngredientIndex()
+
+    def create_recipe(self):
+        recipe = Recipe.objects.create(
+            author=self.author,
+            name='рецепт',
+            text='описание',
+            image='recipes/images/recipe.png',
+            cooking_time=10,
+        )
+        IngredientForRecipe.objects.create(
+            recipe=recipe, ingredient=self.salt, amount=10
+        )
+
+        return recipe
+
+    def matched(self):
+        return {
+            recipe_id for recipe_id, _, _ in self.index.match([self.salt.pk])
+        }
+
+    def test_rebuilt_when_stale(self):
+        self.assertEqual(self.matched(), {self.first.pk})
+
+        second = self.create_recipe()
+
+        self.assertEqual(self.matched(), {self.first.pk, second.pk})
+
+    def test_changes_during_rebuild(self):
+        self.matched()
+        build = self.index.build
+
+        def build_and_change():
+            try:
+                return build()
+            finally:
+                self.index.remove_recipe(self.first.pk)
+
+        with mock.patch.object(self.index, 'build', build_and_change):
+            self.assertEqual(self.matched(), set())
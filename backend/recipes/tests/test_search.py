@@ -0,0 +1,59 @@
+from django.test import TestCase
+
+from recipes.models import Recipe
+from recipes.search import search_recipes, update_recipe_search
+from users.models import User
+
+
+class SearchRecipesTest(TestCase):
+    """Полнотекстовый поиск рецептов: отбор и сортировка по
+    релевантности.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass'
+        )
+        cls.recipes = {
+            name: Recipe.objects.create(
+                author=author,
+                name=name,
+                text=text,
+                image='recipes/images/recipe.png',
+                cooking_time=10,
+            )
+            for name, text in (
+                ('Борщ', 'Свёкла и капуста.'),
+                ('Щи', 'Капуста, как в борщ, но без свёклы.'),
+                ('Омлет', 'Яйца и молоко.'),
+            )
+        }
+        update_recipe_search()
+
+    def search(self, query, queryset=None):
+        if queryset is None:
+            queryset = Recipe.objects.all()
+
+        return list(search_recipes(queryset, query))
+
+    def test_name_match_ranks_first(self):
+        self.assertEqual(
+            self.search('борщ'),
+            [self.recipes['Борщ'], self.recipes['Щи']],
+        )
+
+    def test_no_match(self):
+        self.assertEqual(self.search('блины'), [])
+
+    def test_combines_with_filters(self):
+        queryset = Recipe.objects.exclude(pk=self.recipes['Борщ'].pk)
+
+        self.assertEqual(self.search('борщ', queryset), [self.recipes['Щи']])
+        self.assertEqual(search_recipes(queryset, 'борщ').count(), 1)
+
+    def test_rank_annotation(self):
+        ranks = [recipe.search_rank for recipe in self.search('капуста')]
+
+        self.assertEqual(len(ranks), 2)
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
@@ -0,0 +1,108 @@
+from contextlib import redirect_stdout
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import (Ingredient, IngredientForRecipe, Recipe,
+                            ShoppingCart, ShoppingListItem)
+from users.models import User
+
+
+class ShoppingListAggregateTest(TestCase):
+    """Агрегат списка покупок сходится с корзинами при изменениях
+    в обход API: через ORM, админку и каскадное удаление.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com'
+        )
+        cls.salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        cls.sugar = Ingredient.objects.create(
+            name='сахар', measurement_unit='г'
+        )
+        cls.recipes = []
+        for index in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.user,
+                name=f'рецепт {index}',
+                text='описание',
+                image='recipes/images/recipe.png',
+                cooking_time=10,
+            )
+            IngredientForRecipe.objects.create(
+                recipe=recipe, ingredient=cls.salt, amount=10
+            )
+            cls.recipes.append(recipe)
+        cls.item = IngredientForRecipe.objects.create(
+            recipe=cls.recipes[0], ingredient=cls.sugar, amount=5
+        )
+        for recipe in cls.recipes:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def assert_consistent(self):
+        with redirect_stdout(StringIO()):
+            call_command('rebuild_shopping_lists', check=True)
+
+    def amounts(self):
+        return dict(
+            ShoppingListItem.objects.filter(user=self.user).values_list(
+                'ingredient', 'amount'
+            )
+        )
+
+    def test_cart_created(self):
+        self.assertEqual(self.amounts(), {self.salt.pk: 20, self.sugar.pk: 5})
+        self.assert_consistent()
+
+    def test_cart_deleted(self):
+        ShoppingCart.objects.filter(recipe=self.recipes[0]).delete()
+
+        self.assertEqual(self.amounts(), {self.salt.pk: 10})
+        self.assert_consistent()
+
+    def test_recipe_deleted(self):
+        self.recipes[0].delete()
+
+        self.assertEqual(self.amounts(), {self.salt.pk: 10})
+        self.assert_consistent()
+
+    def test_user_deleted(self):
+        self.user.delete()
+
+        self.assertFalse(ShoppingListItem.objects.exists())
+        self.assert_consistent()
+
+    def test_ingredient_edited(self):
+        self.item.amount = 7
+        self.item.save()
+
+        self.assertEqual(self.amounts(), {self.salt.pk: 20, self.sugar.pk: 7})
+        self.assert_consistent()
+
+    def test_ingredient_moved(self):
+        self.item.recipe = Recipe.objects.create(
+            author=self.user,
+            name='рецепт не в корзине',
+            text='описание',
+            image='recipes/images/recipe.png',
+            cooking_time=10,
+        )
+        self.item.save()
+
+        self.assertEqual(self.amounts(), {self.salt.pk: 20})
+        self.assert_consistent()
+
+    def test_ingredient_deleted(self):
+        self.item.delete()
+
+        self.assertEqual(self.amounts(), {self.salt.pk: 20})
+        self.assert_consistent()
+
+    def test_ingredient_cascade(self):
+        self.sugar.delete()
+
+        self.assertEqual(self.amounts(), {self.salt.pk: 20})
+        self.assert_consistent()
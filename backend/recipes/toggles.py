@@ -0,0 +1,164 @@
+from django.db import connections, router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal
+
+from users.models import Follow
+
+from .models import FavoriteRecipe, ShoppingCart
+
+# Пакетное изменение связей: sender — модель связи, аргументы
+# user_id, target_ids (затронутые id) и created (добавлены или удалены).
+relations_changed = Signal()
+
+
+class RelationToggle:
+    """Добавление и удаление связи юзера с объектом одним запросом.
+
+    Вставка идёт через INSERT ... ON CONFLICT DO NOTHING, удаление —
+    одним DELETE; оба возвращают id затронутых строк, по которым
+    отправляются post_save/post_delete, поэтому повторный запрос
+    не создаёт дублей и не повторяет побочных эффектов.
+
+    Пакетные add_many/remove_many вместо посрочных сигналов шлют
+    один relations_changed на все затронутые строки.
+    """
+
+    def __init__(self, model, target_field):
+        self.model = model
+        self.target_field = target_field
+
+    @property
+    def using(self):
+        return router.db_for_write(self.model)
+
+    def sql(self, template):
+        connection = connections[self.using]
+        options = self.model._meta
+
+        return template.format(
+            table=connection.ops.quote_name(options.db_table),
+            user=connection.ops.quote_name(
+                options.get_field('user').column
+            ),
+            target=connection.ops.quote_name(
+                options.get_field(self.target_field).column
+            ),
+        )
+
+    def instance(self, pk, user_id, target_id):
+        return self.model(
+            pk=pk, user_id=user_id, **{f'{self.target_field}_id': target_id}
+        )
+
+    def add(self, user_id, target_id):
+        """True, если связь создана, False, если уже была."""
+
+        with transaction.atomic(using=self.using):
+            with connections[self.using].cursor() as cursor:
+                cursor.execute(
+                    self.sql(
+                        'INSERT INTO {table} ({user}, {target}) '
+                        'VALUES (%s, %s) ON CONFLICT DO NOTHING RETURNING id'
+                    ),
+                    [user_id, target_id],
+                )
+                row = cursor.fetchone()
+
+            if row is None:
+                return False
+
+            post_save.send(
+                sender=self.model,
+                instance=self.instance(row[0], user_id, target_id),
+                created=True,
+                update_fields=None,
+                raw=False,
+                using=self.using,
+            )
+
+        return True
+
+    def remove(self, user_id, target_id):
+        """True, если связь удалена, False, если её не было."""
+
+        with transaction.atomic(using=self.using):
+            with connections[self.using].cursor() as cursor:
+                cursor.execute(
+                    self.sql(
+                        'DELETE FROM {table} '
+                        'WHERE {user} = %s AND {target} = %s RETURNING id'
+                    ),
+                    [user_id, target_id],
+                )
+                rows = cursor.fetchall()
+
+            for pk, in rows:
+                post_delete.send(
+                    sender=self.model,
+                    instance=self.instance(pk, user_id, target_id),
+                    using=self.using,
+                )
+
+        return bool(rows)
+
+    def add_many(self, user_id, target_ids):
+        """Множество id, для которых связь создана (остальные уже были)."""
+
+        if not target_ids:
+            return set()
+
+        with transaction.atomic(using=self.using):
+            with connections[self.using].cursor() as cursor:
+                cursor.execute(
+                    self.sql(
+                        'INSERT INTO {table} ({user}, {target}) VALUES '
+                        + ', '.join(['(%s, %s)'] * len(target_ids))
+                        + ' ON CONFLICT DO NOTHING RETURNING {target}'
+                    ),
+                    [
+                        value for target_id in target_ids
+                        for value in (user_id, target_id)
+                    ],
+                )
+                created = {target_id for target_id, in cursor.fetchall()}
+
+            self.send(user_id, created, created=True)
+
+        return created
+
+    def remove_many(self, user_id, target_ids):
+        """Множество id, для которых связь удалена (остальных не было)."""
+
+        if not target_ids:
+            return set()
+
+        with transaction.atomic(using=self.using):
+            with connections[self.using].cursor() as cursor:
+                cursor.execute(
+                    self.sql(
+                        'DELETE FROM {table} WHERE {user} = %s AND {target} '
+                        f'IN ({", ".join(["%s"] * len(target_ids))}) '
+                        'RETURNING {target}'
+                    ),
+                    [user_id, *target_ids],
+                )
+                deleted = {target_id for target_id, in cursor.fetchall()}
+
+            self.send(user_id, deleted, created=False)
+
+        return deleted
+
+    def send(self, user_id, target_ids, created):
+        if target_ids:
+            relations_changed.send(
+                sender=self.model,
+                user_id=user_id,
+                target_ids=target_ids,
+                created=created,
+                using=self.using,
+            )
+
+
+favorites = RelationToggle(FavoriteRecipe, 'recipe')
+shopping_cart = RelationToggle(ShoppingCart, 'recipe')
+follows = RelationToggle(Follow, 'author')
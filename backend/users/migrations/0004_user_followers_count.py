@@ -0,0 +1,33 @@
+# Generated by Django 3.2.18 on 2026-10-18 21:01
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def fill_followers_count(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    Follow = apps.get_model('users', 'Follow')
+
+    User.objects.update(followers_count=Coalesce(models.Subquery(
+        Follow.objects.filter(
+            author=models.OuterRef('pk')
+        ).order_by().values('author').annotate(
+            total=models.Count('id')
+        ).values('total')[:1]
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_recipes_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='количество подписчиков'),
+        ),
+        migrations.RunPython(fill_followers_count, migrations.RunPython.noop),
+    ]
@@ -10,6 +10,16 @@ class User(AbstractUser):
         blank=True,
         null=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='количество подписчиков',
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']